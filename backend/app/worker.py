@@ -16,6 +16,9 @@ import traceback
 # Redis Manager
 redis_mgr = RedisManager.from_env()
 
+# orchestrator result statuses whose Redis status was already set
+_STATUS_SET_BY_ORCHESTRATOR = ("success", "interrupted")
+
 
 class CallbackTask(Task):
     """
@@ -25,6 +28,11 @@ class CallbackTask(Task):
     def on_success(self, retval, task_id, args, kwargs):
         """Task 성공 시 호출"""
         user_task_id = kwargs.get('task_id')
+        # The orchestrator already wrote the terminal status ("completed" with
+        # output_path, or "paused" on a human-input interrupt); writing again
+        # costs a round trip and would clobber either of them.
+        if isinstance(retval, dict) and retval.get("status") in _STATUS_SET_BY_ORCHESTRATOR:
+            return
         if user_task_id:
             redis_mgr.set_status(
                 task_id=user_task_id,
@@ -60,6 +60,11 @@ class TaskPaths:
         """data/inputs/ - 모든 입력 루트 (호환성 유지)"""
         return self.root / "data" / "inputs"
 
+    @property
+    def cache_dir(self) -> Path:
+        """data/cache/ - 태스크 간 공유 캐시 (동일 입력 재사용)"""
+        return self.root / "data" / "cache"
+
     @property
     def bgm_dir(self) -> Path:
         """data/bgm/ - BGM 라이브러리"""
@@ -4,8 +4,9 @@ from __future__ import annotations
 import json
 import os
 import logging
+import threading
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, ClassVar
+from typing import Any, Dict, List, Optional, ClassVar, Tuple
 
 import redis
 from common.logger import get_logger
@@ -19,6 +20,7 @@ class RedisManager:
     
     # Class-level connection pool to ensure it's shared across instances
     _pool: ClassVar[Optional[redis.ConnectionPool]] = None
+    _pool_lock: ClassVar[threading.Lock] = threading.Lock()
 
     @classmethod
     def from_env(cls) -> "RedisManager":
@@ -28,30 +30,55 @@ class RedisManager:
 
     def __post_init__(self) -> None:
         if RedisManager._pool is None:
-            logger.info(f"Initializing Redis connection pool: {self.redis_url}")
-            RedisManager._pool = redis.ConnectionPool.from_url(
-                self.redis_url, 
-                decode_responses=True,
-                max_connections=50  # Limit max connections
-            )
+            # Double-checked so concurrent first callers don't each build a pool
+            with RedisManager._pool_lock:
+                if RedisManager._pool is None:
+                    logger.info(f"Initializing Redis connection pool: {self.redis_url}")
+                    RedisManager._pool = redis.ConnectionPool.from_url(
+                        self.redis_url, 
+                        decode_responses=True,
+                        max_connections=50  # Limit max connections
+                    )
         
         self.client = redis.Redis(connection_pool=RedisManager._pool)
         self._r = self.client
 
-    def publish(self, channel: str, message: Any) -> int:
-        """Publish a message to a channel."""
+    def publish(self, channel: str, message: Any, pipe: Optional[redis.client.Pipeline] = None) -> int:
+        """
+        Publish a message to a channel.
+        With `pipe`, the PUBLISH is only queued (returns 0); the caller executes the pipeline.
+        """
         try:
             if not isinstance(message, str):
                 message = json.dumps(message, ensure_ascii=False)
+            if pipe is not None:
+                pipe.publish(channel, message)
+                return 0
             return self._r.publish(channel, message)
         except Exception as e:
             logger.error(f"Failed to publish to {channel}: {e}")
             return 0
 
-    def publish_event(self, task_id: str, event: Dict[str, Any]) -> int:
+    def publish_event(self, task_id: str, event: Dict[str, Any], pipe: Optional[redis.client.Pipeline] = None) -> int:
         """Publish an event to the task's WebSocket channel."""
         channel = f"task:{task_id}"
-        return self.publish(channel, event)
+        return self.publish(channel, event, pipe=pipe)
+
+    def batch(self, ops: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """
+        Run several manager calls in one MULTI/EXEC round trip.
+        
+        Args:
+            ops: (method_name, kwargs) pairs, e.g. ("set_status", {"task_id": ..., "status": ...}).
+                Each method must accept a `pipe` keyword (publish, publish_event, set_status).
+        
+        Returns:
+            The raw pipeline results, one per queued Redis command.
+        """
+        with self._r.pipeline(transaction=True) as pipe:
+            for method_name, kwargs in ops:
+                getattr(self, method_name)(pipe=pipe, **kwargs)
+            return pipe.execute()
 
     def ping(self) -> bool:
         try:
@@ -72,6 +99,7 @@ class RedisManager:
         progress: Optional[int] = None,
         message: Optional[str] = None,
         extra: Optional[Dict[str, Any]] = None,
+        pipe: Optional[redis.client.Pipeline] = None,
     ) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "task_id": task_id,
@@ -87,7 +115,10 @@ class RedisManager:
             payload.update(extra)
 
         try:
-            self._r.setex(self._key(task_id), self.ttl_seconds, json.dumps(payload, ensure_ascii=False))
+            # With `pipe`, the SETEX is queued and sent when the caller executes it
+            (pipe if pipe is not None else self._r).setex(
+                self._key(task_id), self.ttl_seconds, json.dumps(payload, ensure_ascii=False)
+            )
         except Exception as e:
             logger.error(f"Failed to set status for {task_id}: {e}")
             
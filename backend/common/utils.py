@@ -1,10 +1,45 @@
-import re
+import hashlib
 import json
 import logging
 from typing import Any, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _balanced_object_end(text: str, start: int) -> int:
+    """
+    Single forward scan for the '}' closing the object opened at text[start].
+    Braces inside string literals are ignored. Returns -1 if it never closes.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
 def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
     """
     Extracts and parses a JSON object from a given text string.
@@ -21,20 +56,22 @@ def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
 
     text = text.strip()
     
-    # 1. Try to find JSON within markdown code blocks
-    json_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if json_match:
-        json_str = json_match.group(1)
-    else:
-        # 2. Try to find the first '{' and last '}'
+    # 1. Prefer an object inside a markdown code block, else the first '{'
+    fence_idx = text.find('```')
+    start_idx = text.find('{', fence_idx if fence_idx != -1 else 0)
+    if start_idx == -1:
         start_idx = text.find('{')
+    end_idx = _balanced_object_end(text, start_idx) if start_idx != -1 else -1
+    
+    if end_idx == -1 and start_idx != -1:
+        # 2. Unbalanced braces: take the first '{' to the last '}'
         end_idx = text.rfind('}')
         
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_str = text[start_idx : end_idx + 1]
-        else:
-            # 3. Fallback: Assume the whole text might be JSON
-            json_str = text
+    if start_idx != -1 and end_idx > start_idx:
+        json_str = text[start_idx : end_idx + 1]
+    else:
+        # 3. Fallback: Assume the whole text might be JSON
+        json_str = text
 
     try:
         return json.loads(json_str)
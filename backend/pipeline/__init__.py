@@ -1,4 +1,10 @@
 # pipeline/__init__.py
+import os
+
+# Must be set before the first CUDA allocation. Growable segments keep the caching
+# allocator from fragmenting across the SAM 2 -> LTX -> RIFE/Real-CUGAN load/unload cycle.
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
 from . import step1_segmentation
 from . import step2_video_generation
 from . import step3_postprocess
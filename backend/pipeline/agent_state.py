@@ -1,11 +1,16 @@
 import operator
 from typing import TypedDict, Annotated, List, Dict, Any, Union, Optional
 
+def merge_dicts(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reducer: nodes return only their own keys and LangGraph merges them in."""
+    return {**(left or {}), **(right or {})}
+
 class AgentState(TypedDict):
     # Task context
     task_id: str
     user_prompt: str
     image_paths: List[str]
+    image_hashes: List[Optional[str]]  # SHA-256 per image (empty unless segmentation.memoize)
     
     # Configuration (Dynamic - can be patched by Supervisor)
     config: Dict[str, Any]
@@ -13,7 +18,7 @@ class AgentState(TypedDict):
     # Execution State
     current_step: str  # "step1", "step2", "step3"
     next_step: str
-    step_results: Dict[str, Any]  # Stores output of each step
+    step_results: Annotated[Dict[str, Any], merge_dicts]  # Stores output of each step
     
     # Step 1 Outputs (Segmentation)
     segmented_layers: List[str]  # Paths to layer images
@@ -32,6 +37,8 @@ class AgentState(TypedDict):
     retry_count: Dict[str, int]  # Track retries per step
     reflection_history: Annotated[List[str], operator.add]  # Log of supervisor thoughts
     
+    last_qc_decision: Optional[str]  # "proceed" | "retry" | "fail" from the latest QC node
+    
     # Human-in-the-Loop
     human_feedback: Optional[Dict[str, Any]]
     failed_step: Optional[str]
@@ -1,11 +1,9 @@
 from langgraph.checkpoint.redis import RedisSaver
+import functools
 import os
 
-_checkpointer = None
-
+@functools.lru_cache(maxsize=1)
 def get_checkpointer() -> RedisSaver:
-    global _checkpointer
-    if _checkpointer is None:
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-        _checkpointer = RedisSaver.from_url(redis_url)
-    return _checkpointer
+    """Process-wide RedisSaver shared by every compiled graph."""
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    return RedisSaver.from_url(redis_url)
@@ -0,0 +1,27 @@
+"""
+Shared CUDA caching-allocator policy for the model loaders.
+"""
+import torch
+
+# Only hand cached blocks back to the driver when free VRAM drops below this
+EMPTY_CACHE_THRESHOLD_BYTES = 2 * 1024**3
+
+
+def maybe_empty_cache(force: bool = False) -> bool:
+    """
+    Release cached CUDA blocks if free VRAM is low (or `force` is set).
+    
+    empty_cache() synchronizes and makes the next allocations go back to the
+    driver, so skipping it while memory is plentiful keeps model swaps cheap.
+    
+    Returns:
+        True if the cache was emptied
+    """
+    if not torch.cuda.is_available():
+        return False
+    if not force:
+        free_bytes, _ = torch.cuda.mem_get_info()
+        if free_bytes >= EMPTY_CACHE_THRESHOLD_BYTES:
+            return False
+    torch.cuda.empty_cache()
+    return True
@@ -11,18 +11,37 @@ import torch
 from PIL import Image
 from diffusers import DiffusionPipeline
 from diffusers.utils import export_to_video, load_video
+from pathlib import Path
 from typing import Optional
+import functools
 import logging
+import threading
 import os
 from datetime import datetime
 
+from ._mem import maybe_empty_cache
+
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=32)
+def _round_to_vae_resolution(height: int, width: int, compression_ratio: int) -> tuple:
+    """Round resolution down to a multiple of the VAE spatial compression ratio."""
+    return height - (height % compression_ratio), width - (width % compression_ratio)
+
+
 class LTX2ProLoader:
     """Loader for LTX-Video model."""
     
-    def __init__(self, model_id: str = "/app/models/ltx2", device: str = "cuda", use_fp8: bool = False):
+    def __init__(
+        self,
+        model_id: str = "/app/models/ltx2",
+        device: str = "cuda",
+        use_fp8: bool = False,
+        dtype: torch.dtype = torch.bfloat16,
+        compile_transformer: bool = False,
+        cpu_offload: bool = False
+    ):
         """
         Initialize LTX-Video loader.
         
@@ -30,58 +49,92 @@ class LTX2ProLoader:
             model_id: HuggingFace model ID
             device: Device to load model on ("cuda" or "cpu")
             use_fp8: Use FP8 quantization (not yet available, placeholder)
+            dtype: Weight/activation dtype for the pipeline (bfloat16 or float16)
+            compile_transformer: Compile the denoising transformer with torch.compile.
+                The first call per (num_frames, height, width) pays ~30s of compile time.
+            cpu_offload: Keep submodules on CPU and move each to the GPU only while it
+                runs (roughly halves peak VRAM for a small slowdown)
         """
         self.device = device
         self.use_fp8 = use_fp8  # Placeholder for future FP8 support
+        self.dtype = dtype
+        self.compile_transformer = compile_transformer
+        self.cpu_offload = cpu_offload
         self.pipeline = None
+        # Serializes load/unload when several workers share this loader
+        self._load_lock = threading.Lock()
         self.model_id = model_id
         
     def load(self):
         """Load the LTX-Video pipeline."""
-        if self.pipeline is not None:
-            logger.info("LTX-Video already loaded")
-            return
-            
-        logger.info(f"Loading LTX-Video from {self.model_id}")
-        
-        try:
-            # Load with bfloat16 for memory efficiency
-            # FP8 support to be added when available
-            torch_dtype = torch.bfloat16
-            
-            self.pipeline = DiffusionPipeline.from_pretrained(
-                self.model_id,
-                torch_dtype=torch_dtype,
-                trust_remote_code=True
-            )
-            
-            self.pipeline.to(self.device)
-            
-            # Enable VAE tiling for large resolutions
-            self.pipeline.vae.enable_tiling()
-            
-            logger.info("LTX-Video loaded successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to load LTX-Video: {e}")
-            raise
+        with self._load_lock:
+            if self.pipeline is not None:
+                logger.info("LTX-Video already loaded")
+                return
+                
+            logger.info(f"Loading LTX-Video from {self.model_id}")
             
-    def unload(self):
+            try:
+                # Half precision (bfloat16 by default) for memory efficiency
+                # FP8 support to be added when available
+                torch_dtype = self.dtype
+                
+                self.pipeline = DiffusionPipeline.from_pretrained(
+                    self.model_id,
+                    torch_dtype=torch_dtype,
+                    trust_remote_code=True
+                )
+                
+                if self.cpu_offload and self.device == "cuda":
+                    self.pipeline.enable_model_cpu_offload(device=self.device)
+                else:
+                    self.pipeline.to(self.device)
+                
+                # Enable VAE tiling for large resolutions
+                self.pipeline.vae.enable_tiling()
+                
+                # Worker logs are not a TTY; skip per-step tqdm refreshes
+                self.pipeline.set_progress_bar_config(disable=True)
+                
+                if self.compile_transformer and self.cpu_offload:
+                    # Offload hooks move the weights between devices on every call,
+                    # which would invalidate the compiled graph and force recompiles
+                    logger.info("Skipping transformer compile: cpu_offload is enabled")
+                elif self.compile_transformer and self.device == "cuda":
+                    # Shapes are fixed per request (rounded to the VAE grid), so compile
+                    # statically and keep one graph per resolution preset instead of
+                    # recompiling with dynamic shapes. The dynamo limit is process-wide
+                    # (SAM 2 / RIFE / CUGAN compiles share it), so only ever raise it.
+                    if torch._dynamo.config.cache_size_limit < 16:
+                        torch._dynamo.config.cache_size_limit = 16
+                    self.pipeline.transformer = torch.compile(
+                        self.pipeline.transformer,
+                        mode="max-autotune",
+                        dynamic=False
+                    )
+                    logger.info("LTX-Video transformer compiled (max-autotune)")
+                
+                logger.info("LTX-Video loaded successfully")
+                
+            except Exception as e:
+                logger.error(f"Failed to load LTX-Video: {e}")
+                raise
+                
+    def unload(self, release_cache: bool = False):
         """Unload the pipeline to free VRAM."""
-        if self.pipeline is not None:
-            logger.info("Unloading LTX-Video")
-            del self.pipeline
-            self.pipeline = None
-            torch.cuda.empty_cache()
-            
+        with self._load_lock:
+            if self.pipeline is not None:
+                logger.info("Unloading LTX-Video")
+                del self.pipeline
+                self.pipeline = None
+                if release_cache:
+                    maybe_empty_cache(force=True)
+                
     def _round_to_vae_resolution(self, height: int, width: int) -> tuple:
         """Round resolution to be acceptable by VAE."""
-        compression_ratio = self.pipeline.vae_spatial_compression_ratio
-        height = height - (height % compression_ratio)
-        width = width - (width % compression_ratio)
-        return height, width
+        return _round_to_vae_resolution(height, width, self.pipeline.vae_spatial_compression_ratio)
             
-    @torch.no_grad()
+    @torch.inference_mode()
     def generate_video(
         self,
         image_path: str,
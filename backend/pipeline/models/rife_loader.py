@@ -8,10 +8,26 @@ import cv2
 import numpy as np
 from pathlib import Path
 from typing import List, Optional
+import functools
 import logging
+import queue
+import threading
+
+from ._mem import maybe_empty_cache
+from .video_io import VideoReader, VideoWriter, PIPELINE_DEPTH, END_OF_STREAM, encode_worker
 
 logger = logging.getLogger(__name__)
 
+
+def _decode_worker(reader: VideoReader, frames: queue.Queue):
+    """Feed decoded BGR frames into `frames`, then END_OF_STREAM."""
+    try:
+        for frame in reader:
+            frames.put(frame)
+    finally:
+        frames.put(END_OF_STREAM)
+
+
 class RIFELoader:
     def __init__(self, device: str = "cuda", model_version: str = "4.26"):
         """
@@ -24,40 +40,58 @@ class RIFELoader:
         self.device = device
         self.model_version = model_version
         self.model = None
+        # Serializes load/unload when several workers share this loader
+        self._load_lock = threading.Lock()
+        # FP16 on GPU for tensor-core convs; CPU stays in FP32
+        self.dtype = torch.float16 if device == "cuda" else torch.float32
+        # Persistent frame buffers, allocated lazily for the current resolution
+        self._host_frames = None
+        self._device_frame = None
+        self._frame_bufs = None
+        # Whether the IFNet accepts a (K,1,1,1) timestep tensor; detected on first use
+        self._batched_timesteps = None
         
     def load(self):
         """Load the RIFE model."""
-        if self.model is not None:
-            logger.info("RIFE already loaded")
-            return
-            
-        logger.info(f"Loading RIFE v{self.model_version}")
-        
-        try:
-            # Import RIFE model (assuming RIFE is installed)
-            from .rife_arch import IFNet
-            
-            # Load model weights
-            model_path = f"models/rife/rife{self.model_version}.pth"
-            self.model = IFNet()
-            self.model.load_state_dict(torch.load(model_path, map_location=self.device))
-            self.model.to(self.device)
-            self.model.eval()
-            
-            logger.info("RIFE loaded successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to load RIFE: {e}")
-            raise
+        with self._load_lock:
+            if self.model is not None:
+                logger.info("RIFE already loaded")
+                return
+                
+            logger.info(f"Loading RIFE v{self.model_version}")
             
-    def unload(self):
+            try:
+                # Import RIFE model (assuming RIFE is installed)
+                from .rife_arch import IFNet
+                
+                # Load model weights
+                model_path = f"models/rife/rife{self.model_version}.pth"
+                self.model = IFNet()
+                # Memory-map the checkpoint and adopt its tensors directly (no second copy)
+                state_dict = torch.load(model_path, map_location="cpu", mmap=True, weights_only=True)
+                self.model.load_state_dict(state_dict, assign=True)
+                # NHWC weights match cuDNN's fastest FP16 conv kernels
+                self.model.to(self.device, dtype=self.dtype, memory_format=torch.channels_last)
+                self.model.eval()
+                self._batched_timesteps = None
+                
+                logger.info("RIFE loaded successfully")
+                
+            except Exception as e:
+                logger.error(f"Failed to load RIFE: {e}")
+                raise
+                
+    def unload(self, release_cache: bool = False):
         """Unload the model to free VRAM."""
-        if self.model is not None:
-            logger.info("Unloading RIFE")
-            del self.model
-            self.model = None
-            torch.cuda.empty_cache()
-            
+        with self._load_lock:
+            if self.model is not None:
+                logger.info("Unloading RIFE")
+                del self.model
+                self.model = None
+                self._host_frames = self._device_frame = self._frame_bufs = None
+                if release_cache:
+                    maybe_empty_cache(force=True)
+                
     @torch.no_grad()
     def interpolate_video(
         self,
@@ -77,13 +111,10 @@ class RIFELoader:
         
         try:
             # Read input video
-            cap = cv2.VideoCapture(input_video_path)
-            if not cap.isOpened():
-                raise RuntimeError(f"Could not open video: {input_video_path}")
-                
-            original_fps = cap.get(cv2.CAP_PROP_FPS)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            reader = VideoReader(input_video_path, device=self.device)
+            original_fps = reader.fps
+            width = reader.width
+            height = reader.height
             
             if original_fps <= 0:
                 original_fps = 24 # Fallback
@@ -99,44 +130,76 @@ class RIFELoader:
             logger.info(f"Original: {original_fps} FPS, Target: {target_fps} FPS, Factor: {interp_factor}x")
             
             # Setup output video writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             # Update output FPS to match the interpolation
             # If we create 'interp_factor' frames for every 1 input, output fps = input_fps * factor
             real_target_fps = original_fps * interp_factor
-            out = cv2.VideoWriter(output_video_path, fourcc, real_target_fps, (width, height))
+            out = VideoWriter(output_video_path, real_target_fps, width, height)
             
-            # Stream Processing
-            ret, prev_frame = cap.read()
-            if not ret:
-                raise RuntimeError("Video has no frames")
-                
-            # Process loop
-            while True:
-                ret, curr_frame = cap.read()
-                if not ret:
-                    break
+            # Decode and encode run in their own threads so codec time overlaps
+            # with RIFE inference on this thread.
+            decoded = queue.Queue(maxsize=PIPELINE_DEPTH)
+            interpolated = queue.Queue(maxsize=PIPELINE_DEPTH)
+            encode_errors = []
+            decoder = threading.Thread(target=_decode_worker, args=(reader, decoded), daemon=True)
+            encoder = threading.Thread(
+                target=encode_worker,
+                args=(out, interpolated, encode_errors),
+                daemon=True
+            )
+            decoder.start()
+            encoder.start()
+            
+            try:
+                prev_frame = decoded.get()
+                if prev_frame is END_OF_STREAM:
+                    raise RuntimeError("Video has no frames")
                     
-                # 1. Write previous frame (Start of interval)
-                out.write(prev_frame)
-                
-                # 2. Generate intermediates
-                # Preprocess pair
-                f0 = self._preprocess_frame(prev_frame)
-                f1 = self._preprocess_frame(curr_frame)
-                
-                for j in range(1, interp_factor):
-                    timestep = j / interp_factor
-                    mid_frame = self._infer(f0, f1, timestep)
-                    out.write(mid_frame)
-                
-                # Move window
-                prev_frame = curr_frame
+                self._allocate_buffers(height, width)
+                # All intermediate timesteps of a pair are inferred in one batch
+                timesteps = torch.arange(1, interp_factor, device=self.device, dtype=self.dtype)
+                timesteps = timesteps.div_(interp_factor).view(-1, 1, 1, 1)
+                f1 = self._preprocess_frame(prev_frame, 0)
+                slot = 1
+                    
+                # Process loop
+                while True:
+                    curr_frame = decoded.get()
+                    if curr_frame is END_OF_STREAM:
+                        break
+                        
+                    # 1. Write previous frame (Start of interval)
+                    interpolated.put(prev_frame)
+                    
+                    # 2. Generate intermediates
+                    # The previous end frame becomes the new start frame, so only the
+                    # incoming frame is uploaded; the two GPU buffers swap roles.
+                    f0 = f1
+                    f1 = self._preprocess_frame(curr_frame, slot)
+                    slot ^= 1
+                    
+                    for mid_frame in self._infer(f0, f1, timesteps):
+                        interpolated.put(mid_frame)
+                    
+                    # Move window
+                    prev_frame = curr_frame
+                    
+                # Write last frame
+                interpolated.put(prev_frame)
+            finally:
+                interpolated.put(END_OF_STREAM)
+                encoder.join()
+                # Unblock the decoder if inference stopped early
+                while decoder.is_alive():
+                    try:
+                        decoded.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                decoder.join()
+                reader.release()
+                out.release()
                 
-            # Write last frame
-            out.write(prev_frame)
-            
-            cap.release()
-            out.release()
+            if encode_errors:
+                raise encode_errors[0]
             
             logger.info(f"Interpolated video saved to: {output_video_path}")
             return output_video_path
@@ -145,22 +208,87 @@ class RIFELoader:
             logger.error(f"Frame interpolation failed: {e}")
             raise
             
-    def _preprocess_frame(self, frame: np.ndarray) -> torch.Tensor:
-        """Convert OpenCV frame to tensor."""
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = torch.from_numpy(frame).permute(2, 0, 1).float() / 255.0
-        return frame.unsqueeze(0).to(self.device)
+    def _allocate_buffers(self, height: int, width: int):
+        """Allocate pinned host and device frame buffers once per resolution."""
+        if self._host_frames is not None and self._host_frames[0].shape[:2] == (height, width):
+            return
+        pin = self.device == "cuda"
+        # One pinned staging buffer per slot, paired with _frame_bufs
+        self._host_frames = [
+            torch.empty((height, width, 3), dtype=torch.uint8, pin_memory=pin)
+            for _ in range(2)
+        ]
+        self._device_frame = torch.empty((height, width, 3), dtype=torch.uint8, device=self.device)
+        self._frame_bufs = [
+            torch.empty((1, 3, height, width), dtype=self.dtype, device=self.device)
+            .contiguous(memory_format=torch.channels_last)
+            for _ in range(2)
+        ]
+        
+    def _preprocess_frame(self, frame: np.ndarray, slot: int) -> torch.Tensor:
+        """
+        Convert OpenCV frame into self._frame_bufs[slot] (RGB, normalized).
+        
+        Staging goes through the slot's own pinned buffer. The first pair is
+        staged back to back with no sync in between, so one shared buffer could
+        be overwritten while its async H2D copy is still reading it. A slot is
+        only reused two frames later, after _infer's blocking D2H copy.
+        """
+        host_frame = self._host_frames[slot]
+        dst = self._frame_bufs[slot]
+        np.copyto(host_frame.numpy(), frame)
+        self._device_frame.copy_(host_frame, non_blocking=True)
+        # BGR -> RGB while converting to the model dtype
+        bgr = self._device_frame.permute(2, 0, 1)
+        for c in range(3):
+            dst[0, c].copy_(bgr[2 - c])
+        return dst.div_(255.0)
+        
+    def _infer(self, frame0: torch.Tensor, frame1: torch.Tensor, timesteps: torch.Tensor) -> np.ndarray:
+        """
+        Infer all intermediate frames between a pair.
+        
+        The batched path assumes the IFNet takes a per-sample timestep tensor.
+        Many IFNet variants only take a Python float, so the first call probes
+        the batched form and, if the model rejects it, every later call runs
+        one forward per timestep instead.
         
-    def _infer(self, frame0: torch.Tensor, frame1: torch.Tensor, timestep: float) -> np.ndarray:
-        """Infer intermediate frame."""
+        Args:
+            frame0, frame1: (1, 3, H, W) input frames
+            timesteps: (K, 1, 1, 1) interpolation positions in (0, 1)
+            
+        Returns:
+            (K, H, W, 3) uint8 BGR frames
+        """
+        k = timesteps.shape[0]
         with torch.no_grad():
-            output = self.model(frame0, frame1, timestep)
-            output = output.squeeze(0).permute(1, 2, 0).cpu().numpy()
-            output = (output * 255).astype(np.uint8)
-            output = cv2.cvtColor(output, cv2.COLOR_RGB2BGR)
+            output = None
+            if self._batched_timesteps is not False:
+                try:
+                    # expand() broadcasts the pair to K without copying
+                    output = self.model(frame0.expand(k, -1, -1, -1), frame1.expand(k, -1, -1, -1), timesteps)
+                    self._batched_timesteps = True
+                except torch.cuda.OutOfMemoryError:
+                    raise
+                except (TypeError, RuntimeError) as e:
+                    if self._batched_timesteps:
+                        raise
+                    logger.info(f"RIFE model rejects tensor timesteps ({e}); using one pass per timestep")
+                    self._batched_timesteps = False
+            if output is None:
+                output = torch.cat([self.model(frame0, frame1, t) for t in timesteps.flatten().tolist()])
+            # Quantize and swap RGB -> BGR on the GPU; one D2H copy for all K frames
+            output = output.clamp_(0, 1).mul_(255).to(torch.uint8).flip(1)
+            output = output.permute(0, 2, 3, 1).cpu().numpy()
         return output
         
     def estimate_vram(self) -> float:
         """Estimate VRAM usage in GB."""
         # RIFE is lightweight: ~1-2GB
         return 1.5
+
+
+@functools.lru_cache(maxsize=None)
+def get_rife_loader(device: str = "cuda") -> RIFELoader:
+    """Process-wide RIFE loader."""
+    return RIFELoader(device=device)
@@ -6,7 +6,12 @@ Model: facebook/sam2-hiera-large (HuggingFace)
 import torch
 import numpy as np
 from PIL import Image
+from collections import OrderedDict
+import functools
 import logging
+import threading
+import os
+
 try:
     from sam2.build_sam import build_sam2
     from sam2.sam2_image_predictor import SAM2ImagePredictor
@@ -20,20 +25,76 @@ except ImportError as e:
 from typing import List, Optional
 from pathlib import Path
 
+from ._mem import maybe_empty_cache
+
 logger = logging.getLogger(__name__)
 
+# Number of recent images whose encoder features are kept for re-segmentation
+_EMBEDDING_CACHE_SIZE = 4
+
+
+@functools.lru_cache(maxsize=4)
+def _build_sam2_cached(config_name: str, checkpoint_path: str, compile_encoder: bool = False):
+    """
+    Build the SAM 2 model on CPU once per process. unload() parks it back on
+    the CPU, so a reload is a host->device copy instead of a checkpoint read
+    and a Hydra model build.
+    
+    compile_encoder is part of the cache key only: loaders that compile swap in a
+    torch.compile'd image encoder, which must not leak into uncompiled loaders.
+    """
+    return build_sam2(config_name, checkpoint_path, device="cpu")
+
+
+def _features_to(features, device: str):
+    """Move the predictor's feature state (nested dicts/lists of tensors) to `device`."""
+    if isinstance(features, torch.Tensor):
+        return features.to(device)
+    if isinstance(features, dict):
+        return {k: _features_to(v, device) for k, v in features.items()}
+    if isinstance(features, (list, tuple)):
+        return type(features)(_features_to(v, device) for v in features)
+    return features
+
+
+@functools.lru_cache(maxsize=256)
+def _point_prompts(w: int, h: int, prompt_mode: str) -> tuple:
+    """
+    Positive point prompts (coords, labels) for an image of size w x h.
+    Cached per size/mode, so the arrays are returned read-only.
+    """
+    if prompt_mode == "grid":
+        # Use a 2x2 grid of positive points to catch larger objects
+        input_point = np.array([
+            [w//3, h//3], [2*w//3, h//3],
+            [w//3, 2*h//3], [2*w//3, 2*h//3],
+            [w//2, h//2] # Center too
+        ])
+        input_label = np.array([1, 1, 1, 1, 1])
+    else:
+        # Default: Center point
+        input_point = np.array([[w // 2, h // 2]])
+        input_label = np.array([1])
+    input_point.setflags(write=False)
+    input_label.setflags(write=False)
+    return input_point, input_label
+
 class SAM2Loader:
-    def __init__(self, device: str = "cuda", dtype: torch.dtype = torch.bfloat16):
+    def __init__(self, device: str = "cuda", dtype: torch.dtype = torch.bfloat16, compile_encoder: bool = False):
         """
         Initialize SAM 2 loader.
         
         Args:
             device: Device to load model on ("cuda" or "cpu")
             dtype: Data type for model weights
+            compile_encoder: torch.compile the Hiera image encoder (warmed up at load)
         """
         self.device = device
         self.dtype = dtype
+        self.compile_encoder = compile_encoder
         self.predictor = None
+        # Serializes load/unload when several workers share this loader
+        self._load_lock = threading.Lock()
         self.model_id = "facebook/sam2-hiera-large"
         
         # SAM 2 checkpoint and config
@@ -41,49 +102,129 @@ class SAM2Loader:
         self.checkpoint_path = None
         self.config_name = "sam2_hiera_l.yaml"  # Config name from SAM 2 package
         
+        # (path, mtime) -> (rgba, features, orig_hw); QC retries re-segment the same file.
+        # Kept across unload/load so a retry on the shared loader skips the encoder;
+        # unload() parks the features in host RAM so no VRAM stays held.
+        self._embedding_cache: OrderedDict = OrderedDict()
+        
     def load(self):
         """Load the SAM 2 model."""
-        if self.predictor is not None:
-            logger.info("SAM 2 already loaded")
-            return
+        with self._load_lock:
+            if self.predictor is not None:
+                logger.info("SAM 2 already loaded")
+                return
+                
+            logger.info(f"Loading SAM 2 from {self.model_id}")
             
-        logger.info(f"Loading SAM 2 from {self.model_id}")
-        
-        try:
-            # Resolve checkpoint path
-            if self.checkpoint_path is None:
-                # Try to find it in the local_dir
-                local_dir = Path("/app/models/sam2")
-                pt_files = list(local_dir.glob("*.pt"))
-                if pt_files:
-                    self.checkpoint_path = str(pt_files[0])
-                    logger.info(f"Using checkpoint: {self.checkpoint_path}")
-                else:
-                    raise FileNotFoundError(f"SAM 2 checkpoint not found in models/sam2")
+            try:
+                self._resolve_checkpoint()
+                    
+                # Build SAM 2 model using config name and checkpoint path
+                # Note: config_name must be relative to sam2 package configs if build_sam2 uses hydra.initialize_config_module
+                model = _build_sam2_cached(self.config_name, self.checkpoint_path, self.compile_encoder).to(self.device)
+                self.predictor = SAM2ImagePredictor(model)
                 
-                # Local config resolution removed - rely on package defaults
-                # config_name should be "sam2_hiera_l.yaml" as predefined
+                if self.compile_encoder and self.device == "cuda":
+                    self._compile_image_encoder()
                 
-            # Build SAM 2 model using config name and checkpoint path
-            # Note: config_name must be relative to sam2 package configs if build_sam2 uses hydra.initialize_config_module
-            model = build_sam2(self.config_name, self.checkpoint_path, device=self.device)
-            self.predictor = SAM2ImagePredictor(model)
+                logger.info("SAM 2 loaded successfully")
+                
+            except Exception as e:
+                logger.error(f"Failed to load SAM 2: {e}")
+                raise
+                
+    def _resolve_checkpoint(self) -> str:
+        """Locate the checkpoint once; raises FileNotFoundError if there is none."""
+        if self.checkpoint_path is None:
+            # Try to find it in the local_dir
+            local_dir = Path("/app/models/sam2")
+            pt_files = list(local_dir.glob("*.pt"))
+            if pt_files:
+                self.checkpoint_path = str(pt_files[0])
+                logger.info(f"Using checkpoint: {self.checkpoint_path}")
+            else:
+                raise FileNotFoundError(f"SAM 2 checkpoint not found in models/sam2")
             
-            logger.info("SAM 2 loaded successfully")
+            # Local config resolution removed - rely on package defaults
+            # config_name should be "sam2_hiera_l.yaml" as predefined
+        return self.checkpoint_path
+        
+    def model_fingerprint(self) -> str:
+        """Identity of the weights/config in use, without loading the model."""
+        checkpoint_path = self._resolve_checkpoint()
+        return f"{self.config_name}:{checkpoint_path}:{os.path.getmtime(checkpoint_path)}"
+                
+    def unload(self, release_cache: bool = False):
+        """
+        Unload the model to free VRAM.
+        
+        Args:
+            release_cache: Also return cached CUDA blocks to the driver. Off by default
+                since the next task re-uses the allocator pool; VRAMManager empties it
+                when free memory is actually low.
+        """
+        with self._load_lock:
+            if self.predictor is not None:
+                logger.info("Unloading SAM 2")
+                # Keep the cached model in host RAM for the next load
+                self.predictor.model.to("cpu")
+                del self.predictor
+                self.predictor = None
+                for key, (rgba_np, features, orig_hw) in self._embedding_cache.items():
+                    self._embedding_cache[key] = (rgba_np, _features_to(features, "cpu"), orig_hw)
+                if release_cache:
+                    maybe_empty_cache(force=True)
+                
+    def _compile_image_encoder(self):
+        """Compile the image encoder once and warm it up at the 1024px input size."""
+        model = self.predictor.model
+        # The cached model outlives unload(); don't wrap it twice. It is only
+        # shared with other compile_encoder loaders (see _build_sam2_cached).
+        if not hasattr(model.image_encoder, "_orig_mod"):
+            # No CUDA graphs: unload() moves the weights to CPU, which would
+            # invalidate captured buffer addresses
+            model.image_encoder = torch.compile(model.image_encoder, dynamic=False)
             
-        except Exception as e:
-            logger.error(f"Failed to load SAM 2: {e}")
-            raise
+        with torch.inference_mode(), torch.autocast("cuda", dtype=self.dtype):
+            self.predictor.set_image(np.zeros((1024, 1024, 3), dtype=np.uint8))
+        self.predictor.reset_predictor()
+        logger.info("SAM 2 image encoder compiled")
+        
+    def _set_image_cached(self, image_path: str) -> np.ndarray:
+        """
+        Decode the image and run the encoder, reusing cached features when the
+        same unchanged file was encoded recently.
+        
+        Returns:
+            Writable RGBA array of the image
+        """
+        key = (str(Path(image_path).resolve()), os.path.getmtime(image_path))
+        cached = self._embedding_cache.get(key)
+        if cached is not None:
+            self._embedding_cache.move_to_end(key)
+            rgba_np, features, orig_hw = cached
+            # Restore the predictor state that set_image() would have produced
+            # (features may have been parked on the CPU by unload())
+            self.predictor._features = _features_to(features, self.device)
+            self.predictor._orig_hw = orig_hw
+            self.predictor._is_image_set = True
+            self.predictor._is_batch = False
+            logger.info("Reusing cached SAM 2 image embedding")
+            return rgba_np.copy()
             
-    def unload(self):
-        """Unload the model to free VRAM."""
-        if self.predictor is not None:
-            logger.info("Unloading SAM 2")
-            del self.predictor
-            self.predictor = None
-            torch.cuda.empty_cache()
+        # Decode once as RGBA; SAM 2 gets an RGB view, alpha is filled in by the caller
+        with Image.open(image_path) as image:
+            rgba_np = np.array(image.convert("RGBA"))
+        # Hiera encoder in reduced precision; the mask decoder stays in FP32
+        with torch.autocast("cuda", dtype=self.dtype, enabled=self.device == "cuda"):
+            self.predictor.set_image(rgba_np[..., :3])
             
-    @torch.no_grad()
+        self._embedding_cache[key] = (rgba_np.copy(), self.predictor._features, self.predictor._orig_hw)
+        if len(self._embedding_cache) > _EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+        return rgba_np
+        
+    @torch.inference_mode()
     def segment_product(
         self,
         image_path: str,
@@ -101,25 +242,10 @@ class SAM2Loader:
         logger.info(f"Segmenting image: {image_path} with mode: {prompt_mode}")
         
         try:
-            # Load image
-            image = Image.open(image_path).convert("RGB")
-            image_np = np.array(image)
-            self.predictor.set_image(image_np)
-            
-            w, h = image.size
-            
-            if prompt_mode == "grid":
-                # Use a 2x2 grid of positive points to catch larger objects
-                input_point = np.array([
-                    [w//3, h//3], [2*w//3, h//3],
-                    [w//3, 2*h//3], [2*w//3, 2*h//3],
-                    [w//2, h//2] # Center too
-                ])
-                input_label = np.array([1, 1, 1, 1, 1])
-            else:
-                # Default: Center point
-                input_point = np.array([[w // 2, h // 2]])
-                input_label = np.array([1])
+            rgba_np = self._set_image_cached(image_path)
+            h, w = rgba_np.shape[:2]
+            
+            input_point, input_label = _point_prompts(w, h, prompt_mode)
             
             masks, scores, logits = self.predictor.predict(
                 point_coords=input_point,
@@ -131,22 +257,66 @@ class SAM2Loader:
             best_mask_idx = np.argmax(scores)
             mask = masks[best_mask_idx]
             
-            # Create RGBA
-            rgba_image = Image.open(image_path).convert("RGBA")
-            rgba_np = np.array(rgba_image)
-            rgba_np[..., 3] = (mask * 255).astype(np.uint8)
+            # Create RGBA: write alpha straight into the decoded buffer (no float temp)
+            np.multiply(mask, 255, out=rgba_np[..., 3], casting="unsafe")
             
-            return Image.fromarray(rgba_np)
+            return Image.fromarray(rgba_np, mode="RGBA")
             
         except Exception as e:
             logger.error(f"Background removal failed: {e}")
             raise
             
+    @torch.inference_mode()
+    def segment_product_batch(
+        self,
+        image_paths: List[str],
+        prompt_mode: str = "center"
+    ) -> List[Image.Image]:
+        """
+        Segment several product images with one batched encoder pass.
+        Args:
+            image_paths: Input images (may differ in size)
+            prompt_mode: 'center' for single point, 'grid' for multiple points.
+        """
+        if self.predictor is None:
+            raise RuntimeError("Predictor not loaded. Call load() first.")
+            
+        logger.info(f"Segmenting {len(image_paths)} images with mode: {prompt_mode}")
+        
+        try:
+            rgba_list = []
+            for image_path in image_paths:
+                with Image.open(image_path) as image:
+                    rgba_list.append(np.array(image.convert("RGBA")))
+                    
+            # Hiera encoder in reduced precision; the mask decoder stays in FP32
+            with torch.autocast("cuda", dtype=self.dtype, enabled=self.device == "cuda"):
+                self.predictor.set_image_batch([rgba_np[..., :3] for rgba_np in rgba_list])
+                
+            prompts = [_point_prompts(rgba_np.shape[1], rgba_np.shape[0], prompt_mode) for rgba_np in rgba_list]
+            masks_batch, scores_batch, _ = self.predictor.predict_batch(
+                point_coords_batch=[point for point, _ in prompts],
+                point_labels_batch=[label for _, label in prompts],
+                multimask_output=True,
+            )
+            
+            results = []
+            for rgba_np, masks, scores in zip(rgba_list, masks_batch, scores_batch):
+                np.multiply(masks[np.argmax(scores)], 255, out=rgba_np[..., 3], casting="unsafe")
+                results.append(Image.fromarray(rgba_np, mode="RGBA"))
+            return results
+            
         except Exception as e:
-            logger.error(f"Background removal failed: {e}")
+            logger.error(f"Batch background removal failed: {e}")
             raise
             
     def estimate_vram(self) -> float:
         """Estimate VRAM usage in GB."""
         # SAM 2 Hiera Large is relatively small
         return 2.0
+
+
+@functools.lru_cache(maxsize=None)
+def get_sam2_loader(device: str = "cuda", compile_encoder: bool = False) -> SAM2Loader:
+    """Process-wide SAM 2 loader, shared so its embedding cache survives between steps."""
+    return SAM2Loader(device=device, compile_encoder=compile_encoder)
@@ -0,0 +1,150 @@
+"""
+Video I/O helpers shared by the post-processing loaders.
+Encodes through PyAV so NVENC can be used when the GPU exposes it, and
+decodes through torchcodec (NVDEC) when it is installed.
+"""
+from fractions import Fraction
+from typing import Iterator, Sequence
+import logging
+import queue
+
+import av
+import cv2
+import numpy as np
+
+try:
+    from torchcodec.decoders import VideoDecoder
+except ImportError:
+    VideoDecoder = None
+
+logger = logging.getLogger(__name__)
+
+# Frames pulled from NVDEC per device->host copy
+_DECODE_BATCH = 16
+
+# Tried in order; libx264 is the CPU fallback when NVENC is unavailable
+_ENCODERS: Sequence[str] = ("h264_nvenc", "libx264")
+
+# Bounded queue depth between the decode / inference / encode threads
+PIPELINE_DEPTH = 4
+END_OF_STREAM = object()
+
+
+def _encoder_available(codec: str, width: int, height: int, rate: Fraction) -> bool:
+    """
+    Open `codec` on a standalone context. A stream that failed to open can't be
+    removed from a container again, so encoders are probed before add_stream.
+    """
+    try:
+        ctx = av.CodecContext.create(codec, "w")
+        ctx.width = width
+        ctx.height = height
+        ctx.pix_fmt = "yuv420p"
+        ctx.time_base = 1 / rate
+        ctx.open()
+    except Exception as e:
+        logger.debug(f"Encoder {codec} unavailable: {e}")
+        return False
+    return True
+
+
+class VideoWriter:
+    """
+    Drop-in replacement for cv2.VideoWriter (write/release) backed by PyAV.
+    Accepts BGR uint8 frames, as produced by cv2.VideoCapture.
+    """
+    
+    def __init__(self, path: str, fps: float, width: int, height: int, encoders: Sequence[str] = _ENCODERS):
+        rate = Fraction(fps if fps > 0 else 24).limit_denominator(1001)
+        codec = next((c for c in encoders if _encoder_available(c, width, height, rate)), None)
+        if codec is None:
+            raise RuntimeError(f"No usable video encoder among {list(encoders)}")
+            
+        self.container = av.open(path, mode="w")
+        self.stream = self.container.add_stream(codec, rate=rate)
+        self.stream.width = width
+        self.stream.height = height
+        self.stream.pix_fmt = "yuv420p"
+        logger.info(f"Encoding {path} with {codec}")
+            
+    def write(self, frame: np.ndarray):
+        """Encode one BGR frame."""
+        video_frame = av.VideoFrame.from_ndarray(frame, format="bgr24")
+        for packet in self.stream.encode(video_frame):
+            self.container.mux(packet)
+            
+    def release(self):
+        """Flush the encoder and close the container."""
+        if self.stream is not None:
+            for packet in self.stream.encode():
+                self.container.mux(packet)
+            self.stream = None
+        self.container.close()
+
+
+class VideoReader:
+    """
+    Frame source yielding BGR uint8 frames, like cv2.VideoCapture.read().
+    
+    On CUDA with torchcodec installed, frames are decoded by NVDEC and converted
+    to BGR on the GPU in batches; otherwise decoding falls back to OpenCV.
+    """
+    
+    def __init__(self, path: str, device: str = "cuda"):
+        self.path = path
+        self._decoder = None
+        self._cap = None
+        
+        if VideoDecoder is not None and device == "cuda":
+            try:
+                self._decoder = VideoDecoder(path, device=device)
+            except Exception as e:
+                logger.debug(f"NVDEC unavailable for {path}: {e}")
+                
+        if self._decoder is not None:
+            metadata = self._decoder.metadata
+            self.fps = metadata.average_fps or 0.0
+            self.width = metadata.width
+            self.height = metadata.height
+        else:
+            self._cap = cv2.VideoCapture(path)
+            if not self._cap.isOpened():
+                raise RuntimeError(f"Could not open video: {path}")
+            self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+            self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            
+    def __iter__(self) -> Iterator[np.ndarray]:
+        if self._decoder is None:
+            while True:
+                ret, frame = self._cap.read()
+                if not ret:
+                    return
+                yield frame
+            
+        num_frames = len(self._decoder)
+        for start in range(0, num_frames, _DECODE_BATCH):
+            batch = self._decoder.get_frames_in_range(start, min(start + _DECODE_BATCH, num_frames)).data
+            # (B, 3, H, W) RGB -> (B, H, W, 3) BGR in one D2H copy
+            batch = batch.flip(1).permute(0, 2, 3, 1).contiguous().cpu().numpy()
+            yield from batch
+            
+    def release(self):
+        """Release the underlying decoder."""
+        if self._cap is not None:
+            self._cap.release()
+        self._decoder = None
+
+
+def encode_worker(out: "VideoWriter", frames: queue.Queue, errors: list):
+    """Write frames from `frames` until END_OF_STREAM; the first error is kept in `errors`."""
+    while True:
+        frame = frames.get()
+        if frame is END_OF_STREAM:
+            return
+        if errors:
+            continue  # Keep draining so the producer never blocks
+        try:
+            out.write(frame)
+        except Exception as e:
+            errors.append(e)
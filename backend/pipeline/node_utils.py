@@ -1,6 +1,11 @@
+import functools
 import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Literal, Optional
+
+import cv2
+from PIL import Image
+from langgraph.types import Command
 
 from pipeline.agent_state import AgentState
 from pipeline.tools import (
@@ -14,12 +19,73 @@ from pipeline.tools import (
 from common.utils import extract_json_from_text
 from common.redis_manager import RedisManager
 
+try:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch either
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# QC decision -> next node. Anything else (e.g. "fail") escalates to human_input.
+_SEGMENTATION_QC_ROUTE = {"proceed": "video_gen", "retry": "segmentation"}
+_VIDEO_QC_ROUTE = {"proceed": "postprocess", "retry": "video_gen"}
+
+# Default bounds on the cutout's opaque-pixel fraction for a segmentation fast pass
+# (override with config.qc.fast_pass_alpha_range); an empty or full mask fails
+_FAST_PASS_ALPHA_RANGE = (0.01, 0.95)
+# LTX's VAE compresses time 8x, so a clip can decode up to 7 frames short of num_frames
+_LTX_TEMPORAL_STRIDE = 8
+
+@functools.lru_cache(maxsize=1)
+def _get_redis() -> RedisManager:
+    """Shared RedisManager for node-level events (reuses its pooled connection)."""
+    return RedisManager.from_env()
+
+def _cutout_looks_valid(path: str, alpha_range) -> bool:
+    """The cutout has an alpha channel and its opaque fraction is within alpha_range."""
+    low, high = alpha_range
+    with Image.open(path) as img:
+        if img.mode != "RGBA":
+            return False
+        transparent = img.getchannel("A").histogram()[0]
+        coverage = 1 - transparent / (img.width * img.height)
+    return low <= coverage <= high
+
+def _video_looks_valid(path: str, expected_frames: Optional[int]) -> bool:
+    """The clip decodes and has (about) the requested number of frames, at least 2."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return False
+        decoded, _ = cap.read()
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    min_frames = max(2, (expected_frames or 0) - (_LTX_TEMPORAL_STRIDE - 1))
+    return decoded and frame_count >= min_frames
+
+def _fast_qc_pass(state: AgentState, step_name: str, artifact_path: str) -> bool:
+    """
+    Opt-in QC short-circuit: an artifact that passes a cheap content check counts
+    as a pass without the reflection LLM round-trip (and without publishing a QC
+    thought). Anything that fails the check goes to the reflection tool as usual.
+    """
+    qc_config = state.get("config", {}).get("qc", {})
+    if not qc_config.get("fast_pass", False):
+        return False
+    try:
+        if step_name == "segmentation":
+            return _cutout_looks_valid(artifact_path, qc_config.get("fast_pass_alpha_range", _FAST_PASS_ALPHA_RANGE))
+        expected_frames = state.get("step_results", {}).get("video_generation", {}).get("num_frames")
+        return _video_looks_valid(artifact_path, expected_frames)
+    except (OSError, TypeError, ValueError):
+        return False
+
 def parse_tool_output(json_str: str) -> Dict[str, Any]:
     # Tool output is a JSON string, we need to parse it
     try:
-        return json.loads(json_str)
+        return _json_loads(json_str)
     except json.JSONDecodeError:
         # Fallback for malformed json
         return extract_json_from_text(json_str) or {}
@@ -38,13 +104,16 @@ def segmentation_node(state: AgentState):
     logger.info(f"[Graph] Node: Segmentation (res={resolution}, mode={prompt_mode})")
     
     # Call tool (synchronously)
-    # image_paths[0] is assumed to be the main input
+    # image_paths[0] is the main input; the rest share its SAM 2 encoder batch
     result_json = segmentation_tool.invoke({
         "task_id": task_id,
         "image_path": image_paths[0],
+        "extra_image_paths": image_paths[1:],
         "num_layers": num_layers,
         "resolution": resolution,
-        "prompt_mode": prompt_mode
+        "prompt_mode": prompt_mode,
+        "memoize": seg_config.get("memoize", False),
+        "image_hashes": state.get("image_hashes")
     })
     
     result = parse_tool_output(result_json)
@@ -52,15 +121,19 @@ def segmentation_node(state: AgentState):
     return {
         "segmented_layers": result.get("segmented_layers", []),
         "main_product_layer": result.get("abs_main_product_layer") or result.get("main_product_layer"),
-        "step_results": {**state.get("step_results", {}), "segmentation": result}
+        "step_results": {"segmentation": result}
     }
 
-def qc_segmentation_node(state: AgentState):
+def qc_segmentation_node(state: AgentState) -> Command[Literal["video_gen", "segmentation", "human_input"]]:
     task_id = state["task_id"]
     step_name = "segmentation"
     result_summary = f"Generated {len(state['segmented_layers'])} layers. Main layer: {state['main_product_layer']}"
     image_path = state["main_product_layer"] # Check the main cutout
     
+    if _fast_qc_pass(state, step_name, image_path):
+        logger.info(f"[QC Segment] Fast pass for {image_path}")
+        return Command(update={"last_qc_decision": "proceed", "failed_step": None}, goto="video_gen")
+    
     # We rely on the internal retry counting of reflection_tool, but we also track it in state
     result_json = reflection_tool.invoke({
         "task_id": task_id,
@@ -76,7 +149,7 @@ def qc_segmentation_node(state: AgentState):
     
     # Publish reflection to Redis for Frontend
     try:
-        redis_mgr = RedisManager.from_env()
+        redis_mgr = _get_redis()
         redis_mgr.publish_event(task_id, {
             "type": "thought",
             "message": f"[QC Segment] Decision: {decision}\nReflection: {reflection}",
@@ -85,33 +158,16 @@ def qc_segmentation_node(state: AgentState):
     except Exception as e:
         logger.error(f"Failed to publish QC reflection: {e}")
 
-    # Reflection tool already updates Redis config/retry_count, but we should sync graph state if needed
-    # For now, we trust Redis as the source of truth for config, but we need decision for routing.
-    
-    return {
-        "last_qc_decision": decision,
-        "failed_step": "segmentation" if decision not in ["proceed", "retry"] else None, # Actually if retry also failed eventually... 
-        # But wait, logic is: QC returns decision. graph routes.
-        # If it returns "human_input" (which means max retries exceeded or manual intervention needed), 
-        # we should mark failed_step.
-        # But wait, local variable 'decision' is just "proceed" or "retry" usually unless tool says "human_input"?
-        # Actually reflection tool returns "proceed" or "retry".
-        # If retry count > max, tool might return "human_input" or graph logic handles it?
-        # The logic for "human_input" is triggered by...?
-        # Ah, route_segmentation_qc handles routing.
-        # But route_* functions READ state.
-        # So we must set 'failed_step' HERE if decision implies failure.
-        # Reflection tool returns decision. If it's "human_input", we set it.
-        # If it's "retry" but we eventually route to human_input?
-        # Graph routing logic in graph.py says:
-        # if decision == "proceed" -> video_gen
-        # elif decision == "retry" -> segmentation
-        # else -> human_input.
-        # So if decision is anything else (e.g. "human_input" or "fail"), we go to human_input.
-        # So we should set failed_step = "segmentation"
-        "failed_step": "segmentation", # Set current step as context
-        "reflection_history": state.get("reflection_history", []) + [result.get("reflection", "")]
-    }
+    # Reflection tool already updates Redis config/retry_count; we only need the decision for routing.
+    # Routing and 'failed_step' are written in the same update so human_input knows what to retry.
+    return Command(
+        update={
+            "last_qc_decision": decision,
+            "failed_step": "segmentation" if decision != "proceed" else None,
+            "reflection_history": [reflection]
+        },
+        goto=_SEGMENTATION_QC_ROUTE.get(decision, "human_input")
+    )
 
 def video_gen_node(state: AgentState):
     task_id = state["task_id"]
@@ -138,17 +194,17 @@ def video_gen_node(state: AgentState):
         logger.error(f"Video Generation Failed: {result['error']}")
         return {
             "raw_video_path": None,
-            "step_results": {**state.get("step_results", {}), "video_generation": result},
+            "step_results": {"video_generation": result},
             "error": result["error"] # Persist error to state
         }
 
     return {
         "raw_video_path": result.get("abs_raw_video_path") or result.get("raw_video_path"),
-        "step_results": {**state.get("step_results", {}), "video_generation": result},
+        "step_results": {"video_generation": result},
         "error": None
     }
 
-def qc_video_node(state: AgentState):
+def qc_video_node(state: AgentState) -> Command[Literal["postprocess", "video_gen", "human_input"]]:
     task_id = state["task_id"]
     step_name = "video_generation"
     
@@ -158,7 +214,7 @@ def qc_video_node(state: AgentState):
         
         # Publish error thought
         try:
-             redis_mgr = RedisManager.from_env()
+             redis_mgr = _get_redis()
              redis_mgr.publish_event(task_id, {
                 "type": "thought",
                 "message": f"⚠️ 영상 생성 실패 (오류: {state.get('error') or 'Unknown'}).\n재시도하거나 사용자 지침을 요청합니다.",
@@ -166,18 +222,19 @@ def qc_video_node(state: AgentState):
             })
         except: pass
 
-        return {
-            "last_qc_decision": "retry", # Retry or human input?
-            # If we just return retry, it loops back to video_gen. 
-            # If video_gen fails consistently, we need max retry logic.
-            # reflection_tool handles retry counting. Since we SKIP reflection tool here, we must handle it or invoke reflection tool with "FAILURE" summary.
-            # Let's invoke reflection tool with failure summary so it counts retries.
-            "failed_step": "video_gen"
-        }
+        # NOTE: reflection_tool is skipped here, so this retry is not counted against max retries.
+        return Command(
+            update={"last_qc_decision": "retry", "failed_step": "video_gen"},
+            goto="video_gen"
+        )
         
     # Valid video path
     raw_video = state["raw_video_path"]
     
+    if _fast_qc_pass(state, step_name, raw_video):
+        logger.info(f"[QC Video] Fast pass for {raw_video}")
+        return Command(update={"last_qc_decision": "proceed", "failed_step": None}, goto="postprocess")
+    
     result_json = reflection_tool.invoke({
         "task_id": task_id,
         "step_name": step_name,
@@ -190,7 +247,7 @@ def qc_video_node(state: AgentState):
     
     # Publish reflection to Redis for Frontend
     try:
-        redis_mgr = RedisManager.from_env()
+        redis_mgr = _get_redis()
         redis_mgr.publish_event(task_id, {
             "type": "thought",
             "message": f"[QC Video] Decision: {decision}",
@@ -199,10 +256,13 @@ def qc_video_node(state: AgentState):
     except Exception as e:
         logger.error(f"Failed to publish QC reflection: {e}")
     
-    return {
-        "last_qc_decision": decision,
-        "failed_step": "video_gen" if decision != "proceed" else None
-    }
+    return Command(
+        update={
+            "last_qc_decision": decision,
+            "failed_step": "video_gen" if decision != "proceed" else None
+        },
+        goto=_VIDEO_QC_ROUTE.get(decision, "human_input")
+    )
 
 def postprocess_node(state: AgentState):
     task_id = state["task_id"]
@@ -7,14 +7,45 @@ Step 2: Video Generation (LTX-2 FP8)
 Step 3: Post-processing (RIFE + Real-CUGAN + FFmpeg)
 """
 
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional
 from common.paths import TaskPaths
 from common.logger import TaskLogger
 from common.config import Config
 from common.redis_manager import RedisManager
+from common.utils import sha256_file
 from pipeline.vram_manager import VRAMManager
+from pipeline.graph import create_agent_graph
 
+# Separator for the multi-line log banners (each banner is a single log record)
+_BANNER = "=" * 60
+
+# Graph node -> (current_step, progress %, message) reported once the node finishes
+_NODE_PROGRESS = {
+    "segmentation": (1, 25, "Segmentation complete"),
+    "qc_segmentation": (1, 33, "Segmentation QC complete"),
+    "video_gen": (2, 60, "Video generation complete"),
+    "qc_video": (2, 66, "Video QC complete"),
+    "postprocess": (3, 95, "Post-processing complete"),
+}
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        return sha256_file(path)
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _compiled_app():
+    """
+    Compile the agent graph once per process. The topology does not depend on
+    the task; each run is isolated by configurable.thread_id in the checkpointer.
+    """
+    return create_agent_graph()
 
 class PipelineOrchestrator:
     """
@@ -50,26 +81,45 @@ class PipelineOrchestrator:
         self.redis_mgr = redis_mgr or RedisManager.from_env()
         self.vram_mgr = VRAMManager(logger=self.logger, cfg=self.cfg)
         
-        self.logger.info("=" * 60)
-        self.logger.info(f"🎬 PipelineOrchestrator v3.0 (3-Step) initialized")
-        self.logger.info(f"   Task ID: {task_id}")
-        self.logger.info(f"   Images: {len(image_paths)}")
-        self.logger.info(f"   Prompt: '{prompt}'")
-        self.logger.info("=" * 60)
+        # Last (step, progress) reported from the graph stream
+        self._progress = (0, 0)
+        
+        self.logger.info("\n".join([
+            _BANNER,
+            "🎬 PipelineOrchestrator v3.0 (3-Step) initialized",
+            f"   Task ID: {task_id}",
+            f"   Images: {len(image_paths)}",
+            f"   Prompt: '{prompt}'",
+            _BANNER,
+        ]))
     
     def _update_status(self, step: int, progress: int, message: str):
         """
-        Redis status update helper
+        Redis status update helper.
+        Keeps a step status the node's tool already wrote (e.g. 'step2_completed' and its result).
         """
+        current = self.redis_mgr.get_status(self.task_id) or {}
+        status = current.get("status", "")
+        if status.endswith("completed"):
+            extra = {"result": current["result"]} if "result" in current else None
+        else:
+            status, extra = "processing", None
+        
         self.redis_mgr.set_status(
             task_id=self.task_id,
-            status="processing",
+            status=status,
             current_step=step,
             progress=progress,
-            message=message
+            message=message,
+            extra=extra
         )
+        self._progress = (step, progress)
     
-
+    def _report_progress(self, event: Dict):
+        """Publish real progress for each node update yielded by app.stream()"""
+        for node_name in event:
+            if node_name in _NODE_PROGRESS:
+                self._update_status(*_NODE_PROGRESS[node_name])
             
     def _notify_human_input_required(self, state_values: Dict):
         """Helper to notify Redis/Frontend that human input is required"""
@@ -83,22 +133,28 @@ class PipelineOrchestrator:
         # That hook parses `msgData.type`. 
         # The RedisManager publishes events.
         
-        self.redis_mgr.publish_event(
-            self.task_id, 
-            {
-                "type": "human_input_request", 
-                "question": question,
-                "context": state_values.get("failed_step", "unknown")
-            }
-        )
-        
-        self.redis_mgr.set_status(
-            task_id=self.task_id,
-            status="paused", # Use 'paused' or custom status
-            current_step=2,  # Arbitrary or track accurately
-            progress=50,
-            message="Waiting for human feedback"
-        )
+        # Event and status go out in one MULTI/EXEC round trip, so the frontend
+        # never sees "paused" without the matching request (or vice versa)
+        try:
+            self.redis_mgr.batch([
+                ("publish_event", {
+                    "task_id": self.task_id,
+                    "event": {
+                        "type": "human_input_request",
+                        "question": question,
+                        "context": state_values.get("failed_step", "unknown")
+                    }
+                }),
+                ("set_status", {
+                    "task_id": self.task_id,
+                    "status": "paused", # Use 'paused' or custom status
+                    "current_step": self._progress[0],
+                    "progress": self._progress[1],
+                    "message": "Waiting for human feedback"
+                }),
+            ])
+        except Exception as e:
+            self.logger.error(f"Failed to publish human input request: {e}")
 
     def _handle_completion(self, final_state: Dict) -> Dict:
         # Check for errors
@@ -119,12 +175,14 @@ class PipelineOrchestrator:
         if not final_video:
             raise Exception("Pipeline completed but no final video generated")
         
-        self.logger.info("")
-        self.logger.info("=" * 60)
-        self.logger.info("✅ 3-Step Pipeline completed successfully!")
-        self.logger.info(f"   Final video: {final_video}")
-        self.logger.info(f"   Thumbnail: {thumbnail}")
-        self.logger.info("=" * 60)
+        self.logger.info("\n".join([
+            "",
+            _BANNER,
+            "✅ 3-Step Pipeline completed successfully!",
+            f"   Final video: {final_video}",
+            f"   Thumbnail: {thumbnail}",
+            _BANNER,
+        ]))
         
         # Update Redis status
         self.redis_mgr.set_status(
@@ -148,22 +206,53 @@ class PipelineOrchestrator:
             "reflection_history": final_state.get("reflection_history", [])
         }
 
+    def _prepare_inputs(self) -> List[Optional[str]]:
+        """
+        Hash the input images up front (in parallel; it's file I/O) so Step 1's
+        memoization doesn't re-read them. Skipped unless segmentation.memoize is on.
+        """
+        if not self.image_paths or not self.cfg.get("segmentation.memoize", False):
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(self.image_paths), 8)) as ex:
+            return list(ex.map(_hash_file, self.image_paths))
+
+    def _drive_stream(self, inputs: Optional[Dict], config: Dict) -> Dict:
+        """
+        Stream the graph until it ends or interrupts, then report the outcome.
+        Shared by run() (initial state) and resume() (None continues from the checkpoint).
+        """
+        app = _compiled_app()
+        
+        # Use stream to catch interrupts
+        for event in app.stream(inputs, config):
+            # event is a dict of {node_name: output}
+            self._report_progress(event)
+            
+        # Check state after stream ends or interrupts
+        snapshot = app.get_state(config)
+        if snapshot.next and "human_input" in snapshot.next:
+            # Interrupted before human_input
+            self._notify_human_input_required(snapshot.values)
+            return {"status": "interrupted", "awaiting": "human_input"}
+            
+        if not snapshot.next:
+            return self._handle_completion(snapshot.values)
+            
+        return {"status": "running"} # Should not happen in sync run
+
     def run(self) -> Dict:
         """
         Execute 3-step agentic pipeline
         """
-        self.logger.info("=" * 60)
-        self.logger.info("🚀 Starting 3-Step Pipeline...")
-        self.logger.info("=" * 60)
+        self.logger.info(f"{_BANNER}\n🚀 Starting 3-Step Pipeline...\n{_BANNER}")
         
         try:
-            from pipeline.graph import create_agent_graph
-            
             # Initial State for 3-step pipeline
             initial_state = {
                 "task_id": self.task_id,
                 "user_prompt": self.prompt,
                 "image_paths": self.image_paths,
+                "image_hashes": self._prepare_inputs(),
                 "config": self.cfg._data,
                 "current_step": "start",
                 "next_step": "vision",
@@ -184,38 +273,11 @@ class PipelineOrchestrator:
                 "user_guidance": None
             }
             
-            # Compile and run graph
-            app = create_agent_graph(self.task_id)
             config = {"configurable": {"thread_id": self.task_id}}
-            
-            # Use stream to catch interrupts
-            final_state = initial_state
-            for event in app.stream(initial_state, config):
-                # event is a dict of {node_name: output}
-                # We can track progress here if we want
-                pass
-                
-            # Check state after stream ends or interrupts
-            snapshot = app.get_state(config)
-            if snapshot.next and "human_input" in snapshot.next:
-                 # Interrupted before human_input
-                 self._notify_human_input_required(snapshot.values)
-                 return {"status": "interrupted", "awaiting": "human_input"}
-            
-            # If not interrupted, snapshot.values is final state? 
-            # Or event loop finished.
-            if not snapshot.next:
-                 final_state = snapshot.values
-                 return self._handle_completion(final_state)
-            
-            # If still running ...?
-            return {"status": "running"} # Should not happen in sync run
+            return self._drive_stream(initial_state, config)
 
         except Exception as e:
-            self.logger.error("")
-            self.logger.error("=" * 60)
-            self.logger.error(f"❌ Pipeline failed: {str(e)}")
-            self.logger.error("=" * 60)
+            self.logger.error(f"\n{_BANNER}\n❌ Pipeline failed: {str(e)}\n{_BANNER}")
             
             self.redis_mgr.set_status(
                 task_id=self.task_id,
@@ -233,29 +295,14 @@ class PipelineOrchestrator:
         """
         self.logger.info(f"🔄 Resuming Pipeline with feedback: {feedback}")
         try:
-            from pipeline.graph import create_agent_graph
-            app = create_agent_graph(self.task_id)
+            app = _compiled_app()
             config = {"configurable": {"thread_id": self.task_id}}
             
             # Update state with feedback
             app.update_state(config, {"human_feedback": feedback})
             
-            # Resume
             # We pass None as input to continue from interruption
-            for event in app.stream(None, config):
-                pass
-            
-            # Check completion
-            snapshot = app.get_state(config)
-            if snapshot.next and "human_input" in snapshot.next:
-                 self._notify_human_input_required(snapshot.values)
-                 return {"status": "interrupted", "awaiting": "human_input"}
-                 
-            if not snapshot.next:
-                 final_state = snapshot.values
-                 return self._handle_completion(final_state)
-                 
-            return {"status": "running"}
+            return self._drive_stream(None, config)
 
         except Exception as e:
             self.logger.error(f"❌ Resume failed: {str(e)}")
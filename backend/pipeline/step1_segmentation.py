@@ -4,15 +4,58 @@ Uses Qwen-Image-Layered to extract product layers from input image.
 """
 from PIL import Image
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import hashlib
+import json
 import logging
+import os
+import shutil
 from datetime import datetime
 
-from pipeline.models.sam2_loader import SAM2Loader
+from pipeline.models.sam2_loader import get_sam2_loader
 from common.paths import TaskPaths
+from common.utils import sha256_file
 
 logger = logging.getLogger(__name__)
 
+# Memoized segmentations kept on disk (least recently used are pruned first)
+_CACHE_MAX_ENTRIES = 64
+
+
+def _layer_name(i: int) -> str:
+    return "product_layer.png" if i == 0 else f"product_layer_{i}.png"
+
+
+def _segmentation_cache_key(
+    image_paths: List[str],
+    params: Dict[str, Any],
+    image_hashes: Optional[List[Optional[str]]] = None
+) -> Optional[str]:
+    """
+    Content hash of the inputs that determine the SAM 2 output.
+    `params` holds everything besides the image bytes (model fingerprint,
+    prompt mode, resolution, ...). Per-image hashes computed upstream are used
+    when complete; otherwise the files are read here. Returns None if an input
+    can't be read (the step then runs uncached).
+    """
+    if not image_hashes or len(image_hashes) != len(image_paths) or None in image_hashes:
+        try:
+            image_hashes = [sha256_file(image_path) for image_path in image_paths]
+        except OSError:
+            return None
+    key = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    for image_hash in image_hashes:
+        key.update(bytes.fromhex(image_hash))
+    return key.hexdigest()
+
+
+def _prune_cache(cache_root: Path, max_entries: int):
+    """Delete the least recently used entries beyond max_entries (hits refresh mtime)."""
+    entries = [p for p in cache_root.iterdir() if p.is_dir() and not p.name.endswith(".tmp")]
+    entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in entries[max_entries:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
 class Step1Segmentation:
     def __init__(self, vram_manager):
         """
@@ -28,7 +71,8 @@ class Step1Segmentation:
         self,
         task_id: str,
         image_paths: List[str],
-        config: Dict[str, Any]
+        config: Dict[str, Any],
+        image_hashes: Optional[List[Optional[str]]] = None
     ) -> Dict[str, Any]:
         """
         Execute segmentation step.
@@ -37,6 +81,7 @@ class Step1Segmentation:
             task_id: Unique task identifier
             image_paths: List of input image paths
             config: Configuration dictionary
+            image_hashes: SHA-256 of each input image, if already computed (optional)
             
         Returns:
             Dictionary containing:
@@ -52,37 +97,65 @@ class Step1Segmentation:
             num_layers = seg_config.get("num_layers", 4)
             resolution = seg_config.get("resolution", 640)
             
-            # Use first image (assuming single product image)
-            input_image = image_paths[0]
+            # Get detailed config
+            prompt_mode = seg_config.get("prompt_mode", "center")
+            
+            task_paths = TaskPaths.from_repo(task_id)
+            output_dir = task_paths.outputs_task_dir / "segmentation"
+            
+            self.loader = get_sam2_loader(compile_encoder=seg_config.get("compile_encoder", False))
+            
+            # Opt-in: identical uploads with the same model and settings reuse earlier layers
+            cache_dir = None
+            if seg_config.get("memoize", False):
+                cache_dir = self._cache_entry(task_paths, image_paths, image_hashes, {
+                    "prompt_mode": prompt_mode,
+                    "resolution": resolution,
+                    "num_layers": num_layers
+                })
+                if cache_dir is not None and cache_dir.is_dir():
+                    try:
+                        return self._restore_cached(cache_dir, output_dir, len(image_paths), resolution)
+                    except OSError as e:
+                        # e.g. pruned by another worker between is_dir() and the copy
+                        logger.warning(f"[Step 1] Cached segmentation unusable, recomputing: {e}")
             
             # Load model
-            self.loader = SAM2Loader()
             self.vram_manager.load_model("sam2", self.loader)
             
-            # Get detailed config
-            prompt_mode = seg_config.get("prompt_mode", "center")
+            # Perform segmentation (Product only); several uploads share one encoder pass
+            if len(image_paths) > 1:
+                product_images = self.loader.segment_product_batch(
+                    image_paths=image_paths,
+                    prompt_mode=prompt_mode
+                )
+            else:
+                product_images = [self.loader.segment_product(
+                    image_path=image_paths[0],
+                    prompt_mode=prompt_mode
+                )]
             
-            # Perform segmentation (Product only)
-            product_image = self.loader.segment_product(
-                image_path=input_image,
-                prompt_mode=prompt_mode
-            )
-            
-            # Save results
-            output_dir = TaskPaths.from_repo(task_id).outputs_task_dir / "segmentation"
+            # Save results (first image is the main product)
             output_dir.mkdir(parents=True, exist_ok=True)
 
-            product_layer_path = output_dir / "product_layer.png"
-            product_image.save(product_layer_path)
+            layer_paths = []
+            for i, product_image in enumerate(product_images):
+                layer_path = output_dir / _layer_name(i)
+                # Intermediate artifact: fast zlib level, slightly larger file
+                product_image.save(layer_path, format="PNG", compress_level=1)
+                layer_paths.append(str(layer_path))
 
             # Unload model
             self.vram_manager.unload_model("sam2")
+            
+            if cache_dir is not None:
+                self._store_cached(cache_dir, layer_paths, seg_config.get("memoize_max_entries", _CACHE_MAX_ENTRIES))
 
-            logger.info(f"[Step 1] Segmentation complete: Product extracted")
+            logger.info(f"[Step 1] Segmentation complete: {len(layer_paths)} product(s) extracted")
 
             return {
-                "segmented_layers": [str(product_layer_path)],
-                "main_product_layer": str(product_layer_path),
+                "segmented_layers": layer_paths,
+                "main_product_layer": layer_paths[0],
                 "metadata": {
                     "method": "SAM 2",
                     "resolution": resolution,
@@ -96,3 +169,57 @@ class Step1Segmentation:
             if self.loader:
                 self.vram_manager.unload_model("sam2")
             raise
+            
+    def _cache_entry(
+        self,
+        task_paths: TaskPaths,
+        image_paths: List[str],
+        image_hashes: Optional[List[Optional[str]]],
+        params: Dict[str, Any]
+    ) -> Optional[Path]:
+        """Cache directory for these inputs, or None if they can't be keyed."""
+        try:
+            # A checkpoint swap must not serve masks from the previous model
+            model = self.loader.model_fingerprint()
+        except OSError:
+            return None
+        cache_key = _segmentation_cache_key(image_paths, {"model": model, **params}, image_hashes)
+        return task_paths.cache_dir / "segmentation" / cache_key if cache_key else None
+        
+    def _restore_cached(self, cache_dir: Path, output_dir: Path, num_images: int, resolution: int) -> Dict[str, Any]:
+        """Copy memoized layers into this task's output dir instead of running SAM 2."""
+        logger.info(f"[Step 1] Reusing cached segmentation: {cache_dir.name}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        layer_paths = []
+        for i in range(num_images):
+            layer_path = output_dir / _layer_name(i)
+            shutil.copyfile(cache_dir / _layer_name(i), layer_path)
+            layer_paths.append(str(layer_path))
+        # Mark as recently used for _prune_cache
+        os.utime(cache_dir)
+            
+        return {
+            "segmented_layers": layer_paths,
+            "main_product_layer": layer_paths[0],
+            "metadata": {
+                "method": "SAM 2",
+                "resolution": resolution,
+                "cached": True,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+        
+    def _store_cached(self, cache_dir: Path, layer_paths: List[str], max_entries: int):
+        """Publish the layers under cache_dir, then prune; best effort, never fails the step."""
+        tmp_dir = cache_dir.with_name(f"{cache_dir.name}.{os.getpid()}.tmp")
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            for layer_path in layer_paths:
+                shutil.copyfile(layer_path, tmp_dir / Path(layer_path).name)
+            # Atomic publish: readers only ever see a complete entry
+            os.rename(tmp_dir, cache_dir)
+            _prune_cache(cache_dir.parent, max_entries)
+        except OSError as e:
+            logger.warning(f"[Step 1] Could not cache segmentation: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -7,11 +7,16 @@ from typing import Dict, Any
 import logging
 from datetime import datetime
 
+import torch
+
 from pipeline.models.ltx2_pro_loader import LTX2ProLoader
 from common.paths import TaskPaths
 
 logger = logging.getLogger(__name__)
 
+# config "dtype" -> torch dtype accepted by the LTX pipeline
+_LTX_DTYPES = {"bfloat16": torch.bfloat16, "float16": torch.float16}
+
 class Step2VideoGeneration:
     def __init__(self, vram_manager):
         """
@@ -51,6 +56,11 @@ class Step2VideoGeneration:
             ltx_config = config.get("ltx_video", {})
             repo_id = ltx_config.get("repo_id", "Lightricks/LTX-2")
             use_fp8 = ltx_config.get("use_fp8", True)
+            compile_transformer = ltx_config.get("compile_transformer", False)
+            cpu_offload = ltx_config.get("cpu_offload", False)
+            dtype_name = ltx_config.get("dtype", "bfloat16")
+            if dtype_name not in _LTX_DTYPES:
+                raise ValueError(f"Unsupported ltx_video.dtype: {dtype_name}")
             
             num_frames = ltx_config.get("num_frames", 33)
             width = ltx_config.get("width", 832)
@@ -61,7 +71,13 @@ class Step2VideoGeneration:
             seed = ltx_config.get("seed", None)
             
             # Load model
-            self.loader = LTX2ProLoader(model_id=repo_id, use_fp8=use_fp8)
+            self.loader = LTX2ProLoader(
+                model_id=repo_id,
+                use_fp8=use_fp8,
+                dtype=_LTX_DTYPES[dtype_name],
+                compile_transformer=compile_transformer,
+                cpu_offload=cpu_offload
+            )
             self.vram_manager.load_model("ltx2_pro", self.loader)
             
             # Generate video
@@ -89,6 +105,7 @@ class Step2VideoGeneration:
                     "resolution": f"{width}x{height}",
                     "fps": fps,
                     "inference_steps": num_inference_steps,
+                    "dtype": dtype_name,
                     "timestamp": datetime.now().isoformat()
                 }
             }
@@ -8,8 +8,8 @@ import logging
 from datetime import datetime
 import subprocess
 
-from pipeline.models.rife_loader import RIFELoader
-from pipeline.models.real_cugan_loader import RealCUGANLoader
+from pipeline.models.rife_loader import get_rife_loader
+from pipeline.models.real_cugan_loader import get_cugan_loader
 from common.paths import TaskPaths
 
 logger = logging.getLogger(__name__)
@@ -66,7 +66,7 @@ class Step3Postprocess:
                 
                 target_fps = rife_config.get("target_fps", 48)
                 
-                self.rife_loader = RIFELoader()
+                self.rife_loader = get_rife_loader()
                 self.vram_manager.load_model("rife", self.rife_loader)
                 
                 interpolated_path = str(output_dir / "interpolated.mp4")
@@ -86,7 +86,7 @@ class Step3Postprocess:
                 scale = cugan_config.get("scale", 2)
                 model_name = cugan_config.get("model", "pro")
                 
-                self.cugan_loader = RealCUGANLoader(model_name=model_name)
+                self.cugan_loader = get_cugan_loader(model_name=model_name)
                 self.vram_manager.load_model("real_cugan", self.cugan_loader)
                 
                 upscaled_path = str(output_dir / "upscaled.mp4")
@@ -1,8 +1,27 @@
 import base64
+import functools
 import logging
 
+from common.config import Config
+from common.paths import TaskPaths
+from common.logger import TaskLogger
+from pipeline.vram_manager import VRAMManager
+
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=128)
+def get_tool_dependencies(task_id: str):
+    """
+    Per-task (config, task_paths, task_logger, vram_mgr), built once per task_id.
+    QC retries call the same tools repeatedly for one task, and none of these
+    change for the lifetime of the task.
+    """
+    config = Config.load()
+    task_paths = TaskPaths.from_repo(task_id)
+    task_logger = TaskLogger(task_id, task_paths.run_log)
+    vram_mgr = VRAMManager(logger=task_logger, cfg=config)
+    return config, task_paths, task_logger, vram_mgr
+
 def encode_image(image_path: str) -> str:
     """
     Encode image to base64 string.
@@ -1,27 +1,18 @@
 import os
 import json
 import logging
+from typing import List, Optional
 from langchain_core.tools import tool
-from common.config import Config
-from common.paths import TaskPaths
-from common.logger import TaskLogger
 from common.redis_manager import RedisManager
-from pipeline.vram_manager import VRAMManager
 from pipeline.step1_segmentation import Step1Segmentation
 from pipeline.tools.decorators import use_supervisor_config
+from pipeline.tools.common import get_tool_dependencies as _get_tool_dependencies
 
 logger = logging.getLogger(__name__)
 
-def _get_tool_dependencies(task_id: str):
-    config = Config.load()
-    task_paths = TaskPaths.from_repo(task_id)
-    task_logger = TaskLogger(task_id, task_paths.run_log)
-    vram_mgr = VRAMManager(logger=task_logger, cfg=config)
-    return config, task_paths, task_logger, vram_mgr
-
 @tool
 @use_supervisor_config
-def segmentation_tool(task_id: str, image_path: str, num_layers: int = 4, resolution: int = 640, prompt_mode: str = "center") -> str:
+def segmentation_tool(task_id: str, image_path: str, num_layers: int = 4, resolution: int = 640, prompt_mode: str = "center", extra_image_paths: Optional[List[str]] = None, memoize: bool = False, image_hashes: Optional[List[Optional[str]]] = None) -> str:
     """
     Execute Step 1: Image Segmentation.
     Extracts layers from the input image.
@@ -31,6 +22,9 @@ def segmentation_tool(task_id: str, image_path: str, num_layers: int = 4, resolu
         num_layers: Number of layers to extract (default: 4).
         resolution: Processing resolution (default: 640).
         prompt_mode: Segmentation strategy ("center" or "grid"). Use "grid" for complex objects.
+        extra_image_paths: Additional product images, segmented in the same batch (optional).
+        memoize: Reuse layers from an earlier task with identical images (default: False).
+        image_hashes: SHA-256 of each image (main first), used as the memoization key (optional).
     Returns:
         JSON string with result containing segmented_layers paths and main_product_layer path.
     """
@@ -40,16 +34,28 @@ def segmentation_tool(task_id: str, image_path: str, num_layers: int = 4, resolu
         vram_mgr.cleanup() # Ensure fresh start
         executor = Step1Segmentation(vram_mgr)
         
-        # Ensure image_path is absolute if passed as relative
-        if not os.path.isabs(image_path) and not image_path.startswith('http'):
-             image_path = str(task_paths.input_dir / os.path.basename(image_path))
+        # Ensure image paths are absolute if passed as relative
+        image_paths = []
+        for path in [image_path, *(extra_image_paths or [])]:
+            if not os.path.isabs(path) and not path.startswith('http'):
+                path = str(task_paths.input_dir / os.path.basename(path))
+            image_paths.append(path)
 
         # Note: @use_supervisor_config handles the override logic automatically now!
+        seg_config = {
+            "num_layers": num_layers,
+            "resolution": resolution,
+            "prompt_mode": prompt_mode,
+            "memoize": memoize,
+            "memoize_max_entries": config.get("segmentation.memoize_max_entries", 64),
+            "compile_encoder": config.get("segmentation.compile_encoder", False),
+        }
         
         result = executor.execute(
             task_id=task_id,
-            image_paths=[image_path],
-            config={"segmentation": {"num_layers": num_layers, "resolution": resolution, "prompt_mode": prompt_mode}}
+            image_paths=image_paths,
+            config={"segmentation": seg_config},
+            image_hashes=image_hashes
         )
         
         # Convert absolute paths to web-accessible paths for frontend
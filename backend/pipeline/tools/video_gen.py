@@ -2,24 +2,14 @@ import os
 import json
 import logging
 from langchain_core.tools import tool
-from common.config import Config
-from common.paths import TaskPaths
-from common.logger import TaskLogger
 from common.redis_manager import RedisManager
-from pipeline.vram_manager import VRAMManager
 from pipeline.step2_video_generation import Step2VideoGeneration
 from pipeline.step3_postprocess import Step3Postprocess
 from pipeline.tools.decorators import use_supervisor_config
+from pipeline.tools.common import get_tool_dependencies as _get_tool_dependencies
 
 logger = logging.getLogger(__name__)
 
-def _get_tool_dependencies(task_id: str):
-    config = Config.load()
-    task_paths = TaskPaths.from_repo(task_id)
-    task_logger = TaskLogger(task_id, task_paths.run_log)
-    vram_mgr = VRAMManager(logger=task_logger, cfg=config)
-    return config, task_paths, task_logger, vram_mgr
-
 @tool
 @use_supervisor_config
 def video_generation_tool(task_id: str, main_product_layer: str, prompt: str, num_frames: int = 96) -> str:
@@ -37,7 +27,7 @@ def video_generation_tool(task_id: str, main_product_layer: str, prompt: str, nu
     logger.info(f"[Tool] Executing video_generation_tool for task {task_id}")
     try:
         # Resolve path if web path is passed
-        _, task_paths, _, vram_mgr = _get_tool_dependencies(task_id)
+        config, task_paths, _, vram_mgr = _get_tool_dependencies(task_id)
         if "/outputs/" in main_product_layer:
              main_product_layer = str(task_paths.outputs_task_dir / os.path.basename(main_product_layer))
 
@@ -46,18 +36,21 @@ def video_generation_tool(task_id: str, main_product_layer: str, prompt: str, nu
         executor = Step2VideoGeneration(vram_mgr)
         
         # Note: @use_supervisor_config checks 'video_generation:num_frames' in Redis and overrides kwargs['num_frames']
+        # Step 2 reads its model settings (dtype, fp8, ...) from 'ltx_video'; the requested length wins over the yaml
+        ltx_config = {**(config.get("models.ltx_video") or {}), "num_frames": num_frames}
         
         result = executor.execute(
             task_id=task_id,
             main_product_layer=main_product_layer,
             user_prompt=prompt,
-            config={"video_generation": {"num_frames": num_frames}}
+            config={"ltx_video": ltx_config}
         )
 
         # Convert paths to web paths
         converted_result = {
             "raw_video_path": task_paths.to_web_path(result["raw_video_path"]),
             "abs_raw_video_path": str(result["raw_video_path"]), # For agent's vision tool
+            "num_frames": result["metadata"]["num_frames"], # Requested length, checked by the QC fast pass
             "_instruction": "Video generated. execute 'reflection_tool' to verify motion quality."
         }
 
@@ -11,6 +11,7 @@ import gc
 from typing import Optional, Dict, Any
 from common.logger import TaskLogger
 from common.config import Config
+from pipeline.models._mem import maybe_empty_cache
 
 
 class VRAMManager:
@@ -106,7 +107,9 @@ class VRAMManager:
         loader.unload()
         del self.loaded_models[model_name]
         
-        self.cleanup()
+        # The next step usually loads another model right away, so only
+        # return cached blocks to the driver when VRAM is actually tight
+        self.cleanup(force=False)
         self.log_status(f"After unloading {model_name}")
     
     def unload_all(self):
@@ -119,16 +122,18 @@ class VRAMManager:
         for model_name in list(self.loaded_models.keys()):
             self.unload_model(model_name)
     
-    def cleanup(self):
+    def cleanup(self, force: bool = True):
         """
         Clean up VRAM and verify results.
+        
+        Args:
+            force: Always empty the CUDA cache; otherwise only when free VRAM is low
         """
         if self.logger:
             self.logger.info("   [VRAM] Cleaning up...")
         
         # Clear PyTorch cache
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        if maybe_empty_cache(force=force):
             torch.cuda.synchronize()
         
         # Python GC
@@ -0,0 +1,108 @@
+import json
+import pytest
+from unittest.mock import patch
+from PIL import Image
+from langgraph.graph import END
+from pipeline.graph import route_after_human_input
+from pipeline.node_utils import qc_segmentation_node, qc_video_node
+
+@pytest.fixture
+def mock_reflection():
+    with patch("pipeline.node_utils.reflection_tool") as reflect, \
+         patch("pipeline.node_utils._get_redis"):
+        yield reflect
+
+def _seg_state():
+    return {"task_id": "task-123", "segmented_layers": ["layer0.png"], "main_product_layer": "layer0.png"}
+
+@pytest.mark.parametrize("decision, goto, failed_step", [
+    ("proceed", "video_gen", None),
+    ("retry", "segmentation", "segmentation"),
+    ("fail", "human_input", "segmentation"),
+])
+def test_qc_segmentation_routes_with_command(mock_reflection, decision, goto, failed_step):
+    mock_reflection.invoke.return_value = json.dumps({"decision": decision, "reflection": "ok"})
+    cmd = qc_segmentation_node(_seg_state())
+    assert cmd.goto == goto
+    assert cmd.update["last_qc_decision"] == decision
+    assert cmd.update["failed_step"] == failed_step
+    assert cmd.update["reflection_history"] == ["ok"]
+
+@pytest.mark.parametrize("decision, goto", [
+    ("proceed", "postprocess"),
+    ("retry", "video_gen"),
+    ("fail", "human_input"),
+])
+def test_qc_video_routes_with_command(mock_reflection, decision, goto):
+    mock_reflection.invoke.return_value = json.dumps({"decision": decision})
+    cmd = qc_video_node({"task_id": "task-123", "raw_video_path": "video.mp4"})
+    assert cmd.goto == goto
+
+def test_qc_video_retries_failed_generation(mock_reflection):
+    cmd = qc_video_node({"task_id": "task-123", "raw_video_path": None, "error": "OOM"})
+    assert cmd.goto == "video_gen"
+    assert cmd.update["failed_step"] == "video_gen"
+    mock_reflection.invoke.assert_not_called()
+
+@pytest.mark.parametrize("decision, failed_step, expected", [
+    ("retry", "segmentation", "segmentation"),
+    ("retry", "video_gen", "video_gen"),
+    ("proceed", "segmentation", "video_gen"),
+    ("proceed", "video_gen", "postprocess"),
+    ("retry", None, "segmentation"),  # Missing failed_step falls back to segmentation
+    (None, "video_gen", END),
+])
+def test_route_after_human_input(decision, failed_step, expected):
+    state = {"last_qc_decision": decision, "failed_step": failed_step}
+    assert route_after_human_input(state) == expected
+
+def _cutout(tmp_path, opaque_rows):
+    path = tmp_path / "layer0.png"
+    alpha = Image.new("L", (20, 20), 0)
+    alpha.paste(255, (0, 0, 20, opaque_rows))
+    img = Image.new("RGBA", (20, 20), "red")
+    img.putalpha(alpha)
+    img.save(path)
+    return str(path)
+
+def test_qc_fast_pass_accepts_plausible_cutout(mock_reflection, tmp_path):
+    layer = _cutout(tmp_path, opaque_rows=10)
+    state = {"task_id": "task-123", "segmented_layers": [layer], "main_product_layer": layer,
+             "config": {"qc": {"fast_pass": True}}}
+    
+    cmd = qc_segmentation_node(state)
+    
+    assert cmd.goto == "video_gen"
+    assert cmd.update["last_qc_decision"] == "proceed"
+    mock_reflection.invoke.assert_not_called()
+
+def test_qc_fast_pass_sends_empty_mask_to_reflection(mock_reflection, tmp_path):
+    mock_reflection.invoke.return_value = json.dumps({"decision": "retry", "reflection": "empty mask"})
+    layer = _cutout(tmp_path, opaque_rows=0)
+    state = {"task_id": "task-123", "segmented_layers": [layer], "main_product_layer": layer,
+             "config": {"qc": {"fast_pass": True}}}
+    
+    cmd = qc_segmentation_node(state)
+    
+    assert cmd.goto == "segmentation"
+    mock_reflection.invoke.assert_called_once()
+
+@pytest.mark.parametrize("decodes, frame_count, expected_goto", [
+    (True, 89, "postprocess"),   # 96 requested, snapped down by the VAE stride
+    (True, 1, "video_gen"),      # Single frame: not a video, reflection decides
+    (False, 96, "video_gen"),    # Undecodable stream
+])
+def test_qc_fast_pass_checks_video_frames(mock_reflection, decodes, frame_count, expected_goto):
+    mock_reflection.invoke.return_value = json.dumps({"decision": "retry"})
+    state = {"task_id": "task-123", "raw_video_path": "video.mp4",
+             "step_results": {"video_generation": {"num_frames": 96}},
+             "config": {"qc": {"fast_pass": True}}}
+    
+    with patch("pipeline.node_utils.cv2.VideoCapture") as mock_cap:
+        mock_cap.return_value.isOpened.return_value = True
+        mock_cap.return_value.read.return_value = (decodes, None)
+        mock_cap.return_value.get.return_value = frame_count
+        cmd = qc_video_node(state)
+    
+    assert cmd.goto == expected_goto
+    assert mock_reflection.invoke.called == (expected_goto != "postprocess")
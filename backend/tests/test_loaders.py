@@ -1,8 +1,15 @@
+import av
 import pytest
+import torch
+import numpy as np
+from PIL import Image
 from unittest.mock import MagicMock, patch
 from pipeline.models.ltx2_pro_loader import LTX2ProLoader
 from pipeline.models.rife_loader import RIFELoader
 from pipeline.models.real_cugan_loader import RealCUGANLoader
+from pipeline.models import video_io
+from pipeline.models.video_io import VideoWriter
+from pipeline.models.sam2_loader import SAM2Loader
 
 def test_ltx_loader_init():
     loader = LTX2ProLoader(device="cpu")
@@ -36,3 +43,72 @@ def test_rife_loader_init():
 def test_cugan_loader_init():
     loader = RealCUGANLoader(device="cpu")
     assert loader.device == "cpu"
+
+def test_ltx_round_to_vae_resolution():
+    loader = LTX2ProLoader(device="cpu")
+    loader.pipeline = MagicMock(vae_spatial_compression_ratio=32)
+    assert loader._round_to_vae_resolution(480, 832) == (480, 832)
+    assert loader._round_to_vae_resolution(500, 850) == (480, 832)
+
+def test_video_writer_falls_back_to_libx264(tmp_path):
+    # Simulate an FFmpeg build with nvenc compiled in but no usable NVIDIA encoder
+    real_probe = video_io._encoder_available
+    with patch("pipeline.models.video_io._encoder_available",
+               side_effect=lambda codec, *args: codec != "h264_nvenc" and real_probe(codec, *args)):
+        writer = VideoWriter(str(tmp_path / "out.mp4"), 24, 64, 32)
+        for _ in range(3):
+            writer.write(np.zeros((32, 64, 3), dtype=np.uint8))
+        writer.release()
+    
+    with av.open(str(tmp_path / "out.mp4")) as container:
+        assert len(container.streams) == 1
+        assert container.streams.video[0].codec_context.name == "h264"
+        assert container.streams.video[0].frames == 3
+
+def test_sam2_reuses_cached_embedding(tmp_path):
+    image_path = tmp_path / "product.png"
+    Image.new("RGB", (8, 6), "red").save(image_path)
+    
+    loader = SAM2Loader(device="cpu")
+    loader.predictor = MagicMock()
+    loader.predictor.predict.return_value = (np.ones((3, 6, 8)), np.array([0.1, 0.9, 0.5]), None)
+    
+    first = loader.segment_product(str(image_path))
+    second = loader.segment_product(str(image_path))
+    
+    loader.predictor.set_image.assert_called_once()
+    assert loader.predictor.predict.call_count == 2
+    assert first.size == second.size == (8, 6)
+
+def test_sam2_unload_parks_cached_features_on_cpu():
+    loader = SAM2Loader(device="cpu")
+    loader.predictor = MagicMock()
+    image_embed = MagicMock(spec=torch.Tensor)
+    loader._embedding_cache[("product.png", 0.0)] = (None, {"image_embed": image_embed, "high_res_feats": []}, (6, 8))
+    
+    loader.unload()
+    
+    image_embed.to.assert_called_once_with("cpu")
+    _, features, _ = loader._embedding_cache[("product.png", 0.0)]
+    assert features["image_embed"] is image_embed.to.return_value
+
+def test_rife_infer_falls_back_to_float_timesteps():
+    def float_only_ifnet(frame0, frame1, timestep):
+        if not isinstance(timestep, float):
+            raise TypeError("timestep must be a float")
+        return frame0 * (1 - timestep) + frame1 * timestep
+    
+    loader = RIFELoader(device="cpu")
+    loader.model = MagicMock(side_effect=float_only_ifnet)
+    frame0 = torch.zeros((1, 3, 2, 2))
+    frame1 = torch.ones((1, 3, 2, 2))
+    timesteps = torch.tensor([0.25, 0.5]).view(-1, 1, 1, 1)
+    
+    first = loader._infer(frame0, frame1, timesteps)
+    second = loader._infer(frame0, frame1, timesteps)
+    
+    assert first.shape == second.shape == (2, 2, 2, 3)
+    assert first[0, 0, 0, 0] == int(0.25 * 255) and first[1, 0, 0, 0] == int(0.5 * 255)
+    assert loader._batched_timesteps is False
+    # Batched form probed once, then one call per timestep for each pair
+    assert loader.model.call_count == 1 + 2 + 2
@@ -1,11 +1,12 @@
 import pytest
 from unittest.mock import MagicMock, patch
-from pipeline.orchestrator import PipelineOrchestrator
+from pipeline.orchestrator import PipelineOrchestrator, _compiled_app
 from common.redis_manager import RedisManager
 
 @pytest.fixture
 def mock_redis():
     mock = MagicMock(spec=RedisManager)
+    mock.get_status.return_value = None
     return mock
 
 @pytest.fixture
@@ -23,10 +24,11 @@ def mock_config():
 
 @pytest.fixture
 def mock_graph_factory():
-    # Patch where it is defined, because it is imported locally in run()
-    with patch("pipeline.graph.create_agent_graph") as mock_factory:
+    with patch("pipeline.orchestrator.create_agent_graph") as mock_factory:
         mock_app = MagicMock()
         mock_factory.return_value = mock_app
+        # The compiled graph is cached per process; make sure the mock is picked up
+        _compiled_app.cache_clear()
         
         # Simulate successful 3-step graph execution
         mock_app.invoke.return_value = {
@@ -50,6 +52,7 @@ def mock_graph_factory():
             }
         }
         yield mock_factory
+        _compiled_app.cache_clear()
 
 def test_pipeline_execution(mock_redis, mock_vram, mock_config, mock_graph_factory):
     # Init
@@ -72,3 +75,36 @@ def test_pipeline_execution(mock_redis, mock_vram, mock_config, mock_graph_facto
     # Verify graph was compiled and invoked
     mock_graph_factory.assert_called_once()
     mock_graph_factory.return_value.invoke.assert_called_once()
+
+def test_stream_events_report_progress(mock_redis, mock_vram, mock_config):
+    orchestrator = PipelineOrchestrator(task_id="test_task", image_paths=["img1.jpg"], redis_mgr=mock_redis)
+    
+    orchestrator._report_progress({"video_gen": {"raw_video_path": "raw.mp4"}})
+    orchestrator._report_progress({"__interrupt__": ()})
+    
+    mock_redis.set_status.assert_called_once()
+    assert mock_redis.set_status.call_args.kwargs["current_step"] == 2
+    assert orchestrator._progress == (2, 60)
+    assert mock_redis.set_status.call_args.kwargs["status"] == "processing"
+
+def test_progress_keeps_status_written_by_tool(mock_redis, mock_vram, mock_config):
+    orchestrator = PipelineOrchestrator(task_id="test_task", image_paths=["img1.jpg"], redis_mgr=mock_redis)
+    result = {"raw_video_path": "/outputs/test_task/raw.mp4"}
+    mock_redis.get_status.return_value = {"task_id": "test_task", "status": "step2_completed", "result": result}
+    
+    orchestrator._report_progress({"video_gen": {"raw_video_path": "raw.mp4"}})
+    
+    kwargs = mock_redis.set_status.call_args.kwargs
+    assert kwargs["status"] == "step2_completed"
+    assert kwargs["extra"] == {"result": result}
+    assert kwargs["progress"] == 60
+
+def test_human_input_request_is_sent_as_one_batch(mock_redis, mock_vram, mock_config):
+    orchestrator = PipelineOrchestrator(task_id="test_task", image_paths=["img1.jpg"], redis_mgr=mock_redis)
+    
+    orchestrator._notify_human_input_required({"failed_step": "video_gen"})
+    
+    mock_redis.batch.assert_called_once()
+    ops = mock_redis.batch.call_args.args[0]
+    assert [name for name, _ in ops] == ["publish_event", "set_status"]
+    assert ops[1][1]["status"] == "paused"
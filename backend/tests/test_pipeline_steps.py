@@ -1,6 +1,8 @@
+import hashlib
+import os
 import pytest
 from unittest.mock import MagicMock, patch
-from pipeline.step1_segmentation import Step1Segmentation
+from pipeline.step1_segmentation import Step1Segmentation, _segmentation_cache_key
 from pipeline.step2_video_generation import Step2VideoGeneration
 from pipeline.step3_postprocess import Step3Postprocess
 
@@ -9,7 +11,7 @@ def mock_vram():
     return MagicMock()
 
 def test_step1_segmentation_execute(mock_vram):
-    with patch("pipeline.step1_segmentation.SAM2Loader") as mock_loader, \
+    with patch("pipeline.step1_segmentation.get_sam2_loader") as mock_loader, \
          patch("pipeline.step1_segmentation.TaskPaths.from_repo") as mock_paths:
         
         # Mock paths
@@ -45,8 +47,8 @@ def test_step2_video_gen_execute(mock_vram):
         mock_vram.load_model.assert_called_with("ltx2_pro", mock_loader.return_value)
 
 def test_step3_postprocess_execute(mock_vram):
-    with patch("pipeline.step3_postprocess.RIFELoader") as mock_rife, \
-         patch("pipeline.step3_postprocess.RealCUGANLoader") as mock_cugan, \
+    with patch("pipeline.step3_postprocess.get_rife_loader") as mock_rife, \
+         patch("pipeline.step3_postprocess.get_cugan_loader") as mock_cugan, \
          patch("pipeline.step3_postprocess.TaskPaths.from_repo") as mock_paths, \
          patch("pipeline.step3_postprocess.subprocess.run") as mock_run:
         
@@ -67,3 +69,81 @@ def test_step3_postprocess_execute(mock_vram):
         mock_rife.return_value.interpolate_video.assert_called()
         mock_cugan.return_value.upscale_video.assert_called()
         assert mock_run.call_count == 2 # Final encode + thumbnail
+
+def test_step1_segmentation_batches_multiple_images(mock_vram):
+    with patch("pipeline.step1_segmentation.get_sam2_loader") as mock_loader, \
+         patch("pipeline.step1_segmentation.TaskPaths.from_repo"):
+        
+        mock_loader.return_value.segment_product_batch.return_value = [MagicMock(), MagicMock()]
+        
+        step = Step1Segmentation(mock_vram)
+        result = step.execute("task123", ["a.jpg", "b.jpg"], {})
+        
+        mock_loader.return_value.segment_product_batch.assert_called_once()
+        mock_loader.return_value.segment_product.assert_not_called()
+        assert len(result["segmented_layers"]) == 2
+        assert result["main_product_layer"] == result["segmented_layers"][0]
+
+_SEG_PARAMS = {"model": "sam2-v1", "prompt_mode": "center", "resolution": 640, "num_layers": 4}
+
+def _seed_cache(tmp_path, image_path, params=_SEG_PARAMS):
+    cache_entry = tmp_path / "cache" / "segmentation" / _segmentation_cache_key([str(image_path)], params)
+    cache_entry.mkdir(parents=True)
+    (cache_entry / "product_layer.png").write_bytes(b"png")
+    return cache_entry
+
+def _run_memoized(mock_vram, tmp_path, image_path, fingerprint, seg_config=None):
+    with patch("pipeline.step1_segmentation.get_sam2_loader") as mock_loader, \
+         patch("pipeline.step1_segmentation.TaskPaths.from_repo") as mock_paths:
+        mock_paths.return_value.outputs_task_dir = tmp_path / "out"
+        mock_paths.return_value.cache_dir = tmp_path / "cache"
+        mock_loader.return_value.model_fingerprint.return_value = fingerprint
+        product_image = mock_loader.return_value.segment_product.return_value
+        product_image.save.side_effect = lambda path, **kwargs: path.write_bytes(b"png")
+        
+        step = Step1Segmentation(mock_vram)
+        return step.execute("task123", [str(image_path)], {"segmentation": {"memoize": True, **(seg_config or {})}})
+
+def test_step1_memoized_segmentation_skips_sam2(mock_vram, tmp_path):
+    image_path = tmp_path / "img.jpg"
+    image_path.write_bytes(b"same upload")
+    _seed_cache(tmp_path, image_path)
+    
+    result = _run_memoized(mock_vram, tmp_path, image_path, "sam2-v1")
+    
+    mock_vram.load_model.assert_not_called()
+    assert result["metadata"]["cached"] is True
+    assert (tmp_path / "out" / "segmentation" / "product_layer.png").read_bytes() == b"png"
+
+def test_step1_memoization_misses_after_model_swap(mock_vram, tmp_path):
+    image_path = tmp_path / "img.jpg"
+    image_path.write_bytes(b"same upload")
+    _seed_cache(tmp_path, image_path)
+    
+    result = _run_memoized(mock_vram, tmp_path, image_path, "sam2-v2")
+    
+    mock_vram.load_model.assert_called_once()
+    assert "cached" not in result["metadata"]
+
+def test_step1_memoization_prunes_oldest_entries(mock_vram, tmp_path):
+    image_path = tmp_path / "img.jpg"
+    image_path.write_bytes(b"same upload")
+    stale = _seed_cache(tmp_path, image_path, {**_SEG_PARAMS, "resolution": 320})
+    os.utime(stale, (0, 0))
+    
+    _run_memoized(mock_vram, tmp_path, image_path, "sam2-v1", {"memoize_max_entries": 1})
+    
+    entries = list((tmp_path / "cache" / "segmentation").iterdir())
+    assert len(entries) == 1
+    assert entries[0] != stale
+
+def test_step1_cache_key_accepts_precomputed_hashes(tmp_path):
+    image_path = tmp_path / "img.jpg"
+    image_path.write_bytes(b"same upload")
+    
+    from_file = _segmentation_cache_key([str(image_path)], _SEG_PARAMS)
+    from_hash = _segmentation_cache_key(["missing.jpg"], _SEG_PARAMS, [hashlib.sha256(b"same upload").hexdigest()])
+    
+    assert from_file == from_hash
+    assert from_file != _segmentation_cache_key([str(image_path)], {**_SEG_PARAMS, "resolution": 1024})
+    assert _segmentation_cache_key(["missing.jpg"], _SEG_PARAMS, [None]) is None
@@ -0,0 +1,69 @@
+import json
+import torch
+from unittest.mock import MagicMock, patch
+from pipeline.tools.segmentation import segmentation_tool
+from pipeline.tools.video_gen import video_generation_tool
+
+def _yaml_config(values):
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: values.get(key, default)
+    return config
+
+def _run_video_tool(ltx_yaml, num_frames=48):
+    task_paths = MagicMock()
+    task_paths.to_web_path.return_value = "/outputs/task123/raw.mp4"
+    deps = (_yaml_config({"models.ltx_video": ltx_yaml}), task_paths, MagicMock(), MagicMock())
+    
+    with patch("pipeline.tools.video_gen._get_tool_dependencies", return_value=deps), \
+         patch("pipeline.tools.video_gen.RedisManager"), \
+         patch("pipeline.tools.decorators.RedisManager") as mock_overrides, \
+         patch("pipeline.step2_video_generation.TaskPaths.from_repo"), \
+         patch("pipeline.step2_video_generation.LTX2ProLoader") as mock_loader:
+        
+        mock_overrides.from_env.return_value.client.hgetall.return_value = {}
+        mock_loader.return_value.generate_video.return_value = "raw.mp4"
+        
+        result = json.loads(video_generation_tool.invoke({
+            "task_id": "task123",
+            "main_product_layer": "layer0.png",
+            "prompt": "A test prompt",
+            "num_frames": num_frames,
+        }))
+    return mock_loader, result
+
+def test_video_tool_loads_ltx_with_yaml_dtype():
+    mock_loader, result = _run_video_tool({"dtype": "float16", "use_fp8": False})
+    
+    assert mock_loader.call_args.kwargs["dtype"] == torch.float16
+    assert mock_loader.call_args.kwargs["use_fp8"] is False
+    assert result["num_frames"] == 48
+
+def test_video_tool_forwards_compile_transformer():
+    mock_loader, _ = _run_video_tool({"compile_transformer": True})
+    
+    assert mock_loader.call_args.kwargs["compile_transformer"] is True
+
+def test_video_tool_forwards_cpu_offload():
+    mock_loader, _ = _run_video_tool({"cpu_offload": True})
+    
+    assert mock_loader.call_args.kwargs["cpu_offload"] is True
+
+def test_segmentation_tool_forwards_yaml_settings():
+    task_paths = MagicMock()
+    task_paths.to_web_path.return_value = "/outputs/task123/layer0.png"
+    config = _yaml_config({"segmentation.compile_encoder": True, "segmentation.memoize_max_entries": 8})
+    
+    with patch("pipeline.tools.segmentation._get_tool_dependencies", return_value=(config, task_paths, MagicMock(), MagicMock())), \
+         patch("pipeline.tools.segmentation.RedisManager"), \
+         patch("pipeline.tools.decorators.RedisManager") as mock_overrides, \
+         patch("pipeline.tools.segmentation.Step1Segmentation") as mock_step:
+        
+        mock_overrides.from_env.return_value.client.hgetall.return_value = {}
+        mock_step.return_value.execute.return_value = {"segmented_layers": ["layer0.png"], "main_product_layer": "layer0.png"}
+        
+        segmentation_tool.invoke({"task_id": "task123", "image_path": "/in/img.jpg", "memoize": True})
+    
+    seg_config = mock_step.return_value.execute.call_args.kwargs["config"]["segmentation"]
+    assert seg_config["compile_encoder"] is True
+    assert seg_config["memoize_max_entries"] == 8
+    assert seg_config["memoize"] is True
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import MagicMock, patch
 import torch
 from pipeline.vram_manager import VRAMManager
+from pipeline.models._mem import maybe_empty_cache
 from common.config import Config
 
 @pytest.fixture
@@ -68,3 +69,17 @@ def test_cleanup(mock_gc, mock_sync, mock_empty, vram_manager):
         mock_empty.assert_called_once()
         mock_sync.assert_called_once()
         mock_gc.assert_called_once()
+
+@patch("torch.cuda.is_available", return_value=True)
+@patch("torch.cuda.mem_get_info")
+@patch("torch.cuda.empty_cache")
+def test_maybe_empty_cache_skips_when_vram_is_plentiful(mock_empty, mock_mem_info, mock_cuda_avail):
+    mock_mem_info.return_value = (10 * 1024**3, 24 * 1024**3)
+    assert maybe_empty_cache() is False
+    mock_empty.assert_not_called()
+    
+    assert maybe_empty_cache(force=True) is True
+    mock_empty.assert_called_once()
+    
+    mock_mem_info.return_value = (1 * 1024**3, 24 * 1024**3)
+    assert maybe_empty_cache() is True